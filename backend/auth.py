@@ -5,15 +5,22 @@ from typing import Optional
 
 from fastapi import HTTPException, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from passlib.context import CryptContext
-from jose import JWTError, jwt
-
-from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_DAYS
+from jose import jwt
+
+from cache import TTLCache
+from config import (
+    SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_DAYS,
+    USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS,
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE
+)
 from database import db
+from hashing import PasswordHasher
+from tokens import token_verifier
 
 logger = logging.getLogger("powerleave")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher(workers=PASSWORD_HASH_WORKERS, max_queue=PASSWORD_HASH_MAX_QUEUE)
 security = HTTPBearer(auto_error=False)
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS, name="users")
 
 
 def create_access_token(data: dict):
@@ -23,12 +30,17 @@ def create_access_token(data: dict):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await password_hasher.verify(plain_password, hashed_password)
+
 
+async def get_password_hash(password):
+    return await password_hasher.hash(password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+
+def invalidate_user(user_id: str):
+    """Drop a cached user document after it was updated or deleted."""
+    user_cache.pop(user_id)
 
 
 def validate_password(password: str):
@@ -56,26 +68,17 @@ async def get_current_user(
     if not token:
         raise HTTPException(status_code=401, detail="Non autenticato")
 
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Token non valido")
-    except JWTError:
-        # Try session lookup (for OAuth)
-        session = await db.user_sessions.find_one({"session_id": token})
-        if session:
-            if session.get("expires_at") and session["expires_at"] < datetime.now(timezone.utc):
-                raise HTTPException(status_code=401, detail="Sessione scaduta")
-            user_id = session.get("user_id")
-        else:
-            raise HTTPException(status_code=401, detail="Token non valido")
-
-    user = await db.users.find_one({"user_id": user_id}, {"_id": 0, "password_hash": 0})
+    user_id = await token_verifier.resolve(token)
+
+    user = user_cache.get(user_id)
     if user is None:
-        raise HTTPException(status_code=401, detail="Utente non trovato")
+        user = await db.users.find_one({"user_id": user_id}, {"_id": 0, "password_hash": 0})
+        if user is None:
+            raise HTTPException(status_code=401, detail="Utente non trovato")
+        user_cache.set(user_id, user)
 
-    return user
+    # Hand out a copy so handlers cannot mutate the cached document
+    return dict(user)
 
 
 async def get_admin_user(current_user: dict = Depends(get_current_user)):
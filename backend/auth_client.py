@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from typing import Optional
+
+import httpx
+
+from cache import TTLCache
+
+logger = logging.getLogger("powerleave")
+
+
+class AuthServiceClient:
+    """Long-lived client for the Emergent Auth session exchange.
+
+    One pooled `httpx.AsyncClient` is shared by all requests of the worker,
+    so callbacks reuse keep-alive connections instead of paying a new
+    TCP/TLS handshake each time. Transport errors and 5xx answers are
+    retried up to `retries` times. Successful exchanges are cached for
+    `cache_ttl` seconds and concurrent exchanges of the same session_id
+    share a single upstream call, so a double-submitted callback hits the
+    auth service once."""
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 10,
+        retries: int = 2,
+        cache_ttl: float = 60,
+        max_connections: int = 20,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.max_connections = max_connections
+        self._cache = TTLCache(maxsize=1000, ttl=cache_ttl, name="auth_sessions")
+        self._inflight: dict = {}
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5)),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60,
+                ),
+            )
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get_session(self, session_id: str) -> Optional[dict]:
+        """Return the session payload, or None if the auth service rejects it.
+
+        Raises httpx.RequestError once the retry budget is exhausted."""
+        cached = self._cache.get(session_id)
+        if cached is not None:
+            return cached
+
+        pending = self._inflight.get(session_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        task = asyncio.ensure_future(self._fetch(session_id))
+        self._inflight[session_id] = task
+        try:
+            data = await asyncio.shield(task)
+        finally:
+            self._inflight.pop(session_id, None)
+        if data is not None:
+            self._cache.set(session_id, data)
+        return data
+
+    async def _fetch(self, session_id: str) -> Optional[dict]:
+        await self.start()
+        for attempt in range(self.retries + 1):
+            try:
+                resp = await self._client.get(f"/api/auth/session/{session_id}")
+            except httpx.RequestError as exc:
+                if attempt == self.retries:
+                    raise
+                logger.warning("Auth service request failed (%s), retrying", exc)
+            else:
+                if resp.status_code < 500 or attempt == self.retries:
+                    return resp.json() if resp.status_code == 200 else None
+                logger.warning("Auth service returned %d, retrying", resp.status_code)
+            await asyncio.sleep(0.2 * (attempt + 1))
@@ -0,0 +1,180 @@
+from collections import defaultdict
+from typing import Iterable, Tuple, Union
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from database import db
+from metadata import tenant_metadata
+from org_stats import org_stats
+
+BULK_CHUNK_SIZE = 1000
+
+
+async def init_leave_balances(user_ids: Union[str, Iterable[str]], org_id: str, year: int):
+    """Centralized helper to initialize leave balances for new users.
+    Used by register, invite, and OAuth flows (resolves D08 duplication).
+
+    Accepts one user_id or many; every (user, leave type) pair becomes an
+    upsert with $setOnInsert, so existing balances are left untouched and
+    a whole organization is initialised in one bulk_write per chunk."""
+    if isinstance(user_ids, str):
+        user_ids = [user_ids]
+    leave_types = await tenant_metadata.leave_types(org_id)
+    ops = [
+        UpdateOne(
+            {"user_id": user_id, "leave_type_id": lt["id"], "year": year},
+            {"$setOnInsert": {
+                "org_id": org_id,
+                "total_days": lt["days_per_year"],
+                "used_days": 0
+            }},
+            upsert=True
+        )
+        for user_id in user_ids
+        for lt in leave_types
+    ]
+    totals = [lt["days_per_year"] for _ in user_ids for lt in leave_types]
+    created_days = 0
+    for i in range(0, len(ops), BULK_CHUNK_SIZE):
+        result = await db.leave_balances.bulk_write(ops[i:i + BULK_CHUNK_SIZE], ordered=False)
+        created_days += sum(totals[i + index] for index in result.upserted_ids)
+    await org_stats.inc(org_id, {(str(year), "total_days"): created_days})
+
+
+def request_balance_key(leave_request: dict) -> tuple:
+    """(user_id, leave_type_id, year) of the balance a request draws from;
+    the year is the one the leave starts in."""
+    return leave_request["user_id"], leave_request["leave_type_id"], int(leave_request["start_date"][:4])
+
+
+def request_used_days(leave_request: dict) -> float:
+    return leave_request["days"] * (leave_request.get("hours", 8) / 8)
+
+
+async def deduct_request_days(org_id: str, leave_request: dict, total_days: float,
+                              stats_changes: dict = None) -> bool:
+    """Add an approved request's days to its balance exactly once.
+
+    The request id is pushed to the balance's `applied_request_ids` ledger
+    in the same atomic update as the $inc, and the filter excludes balances
+    that already list it, so a retried or concurrent call is a no-op: the
+    filter misses, the upsert collides with the unique balance key and the
+    DuplicateKeyError is swallowed. Returns False when already applied.
+
+    `stats_changes` are further org_stats changes (e.g. the review's) to
+    apply in the same counter update."""
+    changes = defaultdict(float, stats_changes or {})
+    user_id, type_id, year = request_balance_key(leave_request)
+    used_days = request_used_days(leave_request)
+    try:
+        result = await db.leave_balances.update_one(
+            {"user_id": user_id, "leave_type_id": type_id, "year": year,
+             "applied_request_ids": {"$ne": leave_request["id"]}},
+            {
+                "$inc": {"used_days": used_days},
+                "$push": {"applied_request_ids": leave_request["id"]},
+                "$setOnInsert": {"org_id": org_id, "total_days": total_days}
+            },
+            upsert=True
+        )
+    except DuplicateKeyError:
+        await org_stats.inc(org_id, changes)
+        return False
+    changes[(str(year), "used_days")] += used_days
+    if result.upserted_id is not None:
+        changes[(str(year), "total_days")] += total_days
+    await org_stats.inc(org_id, changes)
+    return True
+
+
+async def apply_balance_deltas(org_id: str, deltas: dict, total_days_by_type: dict, ledger: dict = None):
+    """Add used days to many balances in one bulk_write.
+    `deltas` maps (user_id, leave_type_id, year) to the days to add; balances
+    that do not exist yet are created with the leave type's yearly allowance.
+
+    When `ledger` maps the same keys to the request ids behind each delta,
+    the ids are recorded in `applied_request_ids` like deduct_request_days
+    does, and balances that already list one of them are skipped."""
+    ops, applied = [], []
+    for key, days in deltas.items():
+        if not days:
+            continue
+        user_id, type_id, year = key
+        query = {"user_id": user_id, "leave_type_id": type_id, "year": year}
+        update = {
+            "$inc": {"used_days": days},
+            "$setOnInsert": {"org_id": org_id, "total_days": total_days_by_type.get(type_id, 0)}
+        }
+        if ledger and ledger.get(key):
+            query["applied_request_ids"] = {"$nin": ledger[key]}
+            update["$push"] = {"applied_request_ids": {"$each": ledger[key]}}
+        ops.append(UpdateOne(query, update, upsert=True))
+        applied.append((key, days))
+    if not ops:
+        return
+    try:
+        result = await db.leave_balances.bulk_write(ops, ordered=False)
+        failed, upserted = set(), set(result.upserted_ids)
+    except BulkWriteError as exc:
+        # Duplicate keys are balances whose ledger already had the requests
+        if any(e.get("code") != 11000 for e in exc.details.get("writeErrors", [])):
+            raise
+        failed = {e["index"] for e in exc.details["writeErrors"]}
+        upserted = {u["index"] for u in exc.details.get("upserted", [])}
+
+    changes = defaultdict(float)
+    for index, (op_key, days) in enumerate(applied):
+        if index in failed:
+            continue
+        year = str(op_key[2])
+        changes[(year, "used_days")] += days
+        if index in upserted:
+            changes[(year, "total_days")] += total_days_by_type.get(op_key[1], 0)
+    await org_stats.inc(org_id, changes)
+
+
+def request_deltas(leave_requests: Iterable[dict]) -> Tuple[dict, dict]:
+    """(deltas, ledger) for apply_balance_deltas from approved requests."""
+    deltas, ledger = defaultdict(float), defaultdict(list)
+    for r in leave_requests:
+        key = request_balance_key(r)
+        deltas[key] += request_used_days(r)
+        ledger[key].append(r["id"])
+    return deltas, ledger
+
+
+async def restore_request_days(org_id: str, leave_requests: Iterable[dict]):
+    """Give back the days of deleted approved requests.
+
+    Only requests listed in their balance's `applied_request_ids` ledger
+    are restored, and their ids are pulled in the same update, so each is
+    given back at most once; requests approved before the ledger existed
+    are left to the reconciliation job."""
+    by_id = {r["id"]: r for r in leave_requests}
+    if not by_id:
+        return
+    keys = {request_balance_key(r) for r in by_id.values()}
+    ops, changes = [], defaultdict(float)
+    async for balance in db.leave_balances.find(
+        {"$or": [{"user_id": u, "leave_type_id": t, "year": y} for u, t, y in keys],
+         "applied_request_ids": {"$in": list(by_id)}},
+        {"_id": 1, "year": 1, "applied_request_ids": 1}
+    ):
+        ids = [i for i in balance["applied_request_ids"] if i in by_id]
+        days = sum(request_used_days(by_id[i]) for i in ids)
+        ops.append(UpdateOne(
+            {"_id": balance["_id"], "applied_request_ids": {"$all": ids}},
+            {"$inc": {"used_days": -days}, "$pull": {"applied_request_ids": {"$in": ids}}}
+        ))
+        changes[(str(balance["year"]), "used_days")] -= days
+    if ops:
+        await db.leave_balances.bulk_write(ops, ordered=False)
+        await org_stats.inc(org_id, changes)
+
+
+async def release_requests(org_id: str, leave_requests: list):
+    """Bookkeeping for deleted leave requests: drop them from the org's
+    counters and give approved ones' days back to their balances."""
+    await org_stats.requests_deleted(org_id, leave_requests)
+    await restore_request_days(org_id, [r for r in leave_requests if r.get("status") == "approved"])
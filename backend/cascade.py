@@ -0,0 +1,39 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from config import JOB_CHUNK_SIZE, CASCADE_DELETE_PAUSE_SECONDS
+from jobs import Job
+
+
+OnDeleted = Callable[[List[dict]], Awaitable[None]]
+
+
+async def cascade_delete(job: Job, targets: List[Tuple[object, dict, Optional[OnDeleted]]]) -> dict:
+    """Delete the documents matching each (collection, query, on_deleted)
+    target in batches of JOB_CHUNK_SIZE, sleeping CASCADE_DELETE_PAUSE_SECONDS
+    between batches so a large tenant's cleanup never monopolizes the primary.
+
+    Each batch selects documents through the query's index and removes them
+    with one delete_many; `on_deleted`, when given, receives every deleted
+    batch so counters and balances follow the deletion as it progresses.
+    Returns the number deleted per collection."""
+    total = 0
+    for collection, query, _ in targets:
+        total += await collection.count_documents(query)
+    await job.progress(total=total)
+
+    deleted = {}
+    for collection, query, on_deleted in targets:
+        deleted[collection.name] = 0
+        projection = None if on_deleted else {"_id": 1}
+        while True:
+            batch = await collection.find(query, projection).limit(JOB_CHUNK_SIZE).to_list(JOB_CHUNK_SIZE)
+            if not batch:
+                break
+            result = await collection.delete_many({"_id": {"$in": [d["_id"] for d in batch]}})
+            if on_deleted:
+                await on_deleted(batch)
+            deleted[collection.name] += result.deleted_count
+            await job.progress(result.deleted_count)
+            await asyncio.sleep(CASCADE_DELETE_PAUSE_SECONDS)
+    return deleted
@@ -0,0 +1,125 @@
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from balances import apply_balance_deltas, release_requests, request_deltas
+from config import JOB_CHUNK_SIZE
+from database import db
+from jobs import Job
+from metadata import tenant_metadata
+from org_stats import org_stats
+from overlap import overlap_checker
+from versions import org_versions
+from workdays import working_days
+
+CLOSURE_LEAVE_TYPE = "ferie"
+
+
+async def generate_closure_leave(job: Job, closure: dict, reviewed_by: str) -> dict:
+    """Create an approved leave request for every user of the closure's
+    organization, JOB_CHUNK_SIZE users at a time with insert_many.
+
+    Users with an approved exception for the closure, or with an active
+    request overlapping it, are skipped; this also makes a rerun for the
+    same closure a no-op. Generation stops once the closure is deleted, and
+    a chunk inserted while it was being deleted is removed again, so the
+    delete's cascade cannot miss it."""
+    org_id = closure["org_id"]
+    start_date, end_date = closure["start_date"], closure["end_date"]
+
+    days = await working_days.count(org_id, start_date, end_date)
+    total = await db.users.count_documents({"org_id": org_id})
+    await job.progress(total=total)
+    if days == 0:
+        return {"created": 0, "skipped": total}
+
+    leave_type = await tenant_metadata.leave_type(org_id, CLOSURE_LEAVE_TYPE)
+    excepted = set(await db.closure_exceptions.distinct(
+        "user_id", {"closure_id": closure["id"], "status": "approved"}
+    ))
+
+    created = skipped = 0
+    users = db.users.find(
+        {"org_id": org_id}, {"_id": 0, "user_id": 1, "name": 1}
+    ).batch_size(JOB_CHUNK_SIZE)
+    async for chunk in _chunks(users, JOB_CHUNK_SIZE):
+        inserted = await _insert_chunk(chunk, closure, days, leave_type, excepted, reviewed_by)
+        if inserted is None:
+            return {"created": created, "skipped": skipped, "cancelled": True}
+        created, skipped = created + inserted, skipped + len(chunk) - inserted
+        await job.progress(len(chunk))
+
+    return {"created": created, "skipped": skipped}
+
+
+async def _chunks(cursor, size: int):
+    chunk = []
+    async for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def _closure_exists(closure: dict) -> bool:
+    return await db.company_closures.count_documents({"id": closure["id"]}, limit=1) > 0
+
+
+async def _insert_chunk(users: list, closure: dict, days: int, leave_type: dict,
+                        excepted: set, reviewed_by: str) -> Optional[int]:
+    """Insert the chunk's leave; None when the closure has been deleted."""
+    if not await _closure_exists(closure):
+        return None
+    start_date, end_date = closure["start_date"], closure["end_date"]
+    candidates = [u for u in users if u["user_id"] not in excepted]
+    conflicts = await overlap_checker.check_many(
+        [(u["user_id"], start_date, end_date) for u in candidates], refresh=True
+    )
+
+    now = datetime.now(timezone.utc)
+    docs = [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": u["user_id"],
+            "user_name": u["name"],
+            "org_id": closure["org_id"],
+            "leave_type_id": CLOSURE_LEAVE_TYPE,
+            "leave_type_name": leave_type["name"] if leave_type else "Ferie",
+            "start_date": start_date,
+            "end_date": end_date,
+            "days": days,
+            "hours": 8,
+            "notes": f"Chiusura aziendale: {closure['reason']}",
+            "status": "approved",
+            "closure_id": closure["id"],
+            "is_closure_leave": True,
+            "reviewed_by": reviewed_by,
+            "reviewed_at": now,
+            "created_at": now,
+        }
+        for u, conflict in zip(candidates, conflicts)
+        if not conflict
+    ]
+    if docs:
+        await db.leave_requests.insert_many(docs, ordered=False)
+        await org_stats.requests_added(closure["org_id"], docs)
+        # Same request-id ledger as reviews, so the days are deducted once
+        deltas, ledger = request_deltas(docs)
+        total_days = {CLOSURE_LEAVE_TYPE: leave_type["days_per_year"] if leave_type else 0}
+        await apply_balance_deltas(closure["org_id"], deltas, total_days, ledger=ledger)
+        org_versions.bump(closure["org_id"])
+    for doc in docs:
+        overlap_checker.invalidate(doc["user_id"])
+
+    # Deleted meanwhile: its cascade may already have swept
+    if docs and not await _closure_exists(closure):
+        remaining = set(await db.leave_requests.distinct("id", {"id": {"$in": [d["id"] for d in docs]}}))
+        await db.leave_requests.delete_many({"id": {"$in": list(remaining)}})
+        await release_requests(closure["org_id"], [d for d in docs if d["id"] in remaining])
+        org_versions.bump(closure["org_id"])
+        for doc in docs:
+            overlap_checker.invalidate(doc["user_id"])
+        return None
+    return len(docs)
@@ -17,3 +17,80 @@ if not SECRET_KEY:
 
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 7
+
+# In-process cache of authenticated user documents (per worker)
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.environ.get("USER_CACHE_TTL_SECONDS", "30"))
+
+# Thread pool used for bcrypt hashing/verification
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+# Verified-token cache and negative cache for invalid tokens (per worker)
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL_SECONDS = float(os.environ.get("TOKEN_CACHE_TTL_SECONDS", "300"))
+TOKEN_NEGATIVE_TTL_SECONDS = float(os.environ.get("TOKEN_NEGATIVE_TTL_SECONDS", "60"))
+
+# Rate limit counters: any `limits` storage URI (mongodb://, redis://, memory://)
+RATELIMIT_STORAGE_URI = os.environ.get("RATELIMIT_STORAGE_URI", MONGO_URL)
+RATELIMIT_STRATEGY = os.environ.get("RATELIMIT_STRATEGY", "moving-window")
+# The limiter calls its MongoDB storage synchronously on the event loop:
+# keep server selection and socket waits short
+RATELIMIT_STORAGE_TIMEOUT_MS = int(os.environ.get("RATELIMIT_STORAGE_TIMEOUT_MS", "250"))
+
+# Emergent Auth session exchange (OAuth callback)
+AUTH_SERVICE_URL = os.environ.get("AUTH_SERVICE_URL", "https://auth.emergentapi.com")
+AUTH_SERVICE_TIMEOUT_SECONDS = float(os.environ.get("AUTH_SERVICE_TIMEOUT_SECONDS", "10"))
+AUTH_SERVICE_RETRIES = int(os.environ.get("AUTH_SERVICE_RETRIES", "2"))
+AUTH_SESSION_CACHE_TTL_SECONDS = float(os.environ.get("AUTH_SESSION_CACHE_TTL_SECONDS", "60"))
+
+# Per-user leave interval cache used by bulk overlap checks
+INTERVAL_CACHE_SIZE = int(os.environ.get("INTERVAL_CACHE_SIZE", "5000"))
+INTERVAL_CACHE_TTL_SECONDS = float(os.environ.get("INTERVAL_CACHE_TTL_SECONDS", "60"))
+
+# Bulk leave-request import
+IMPORT_MAX_ROWS = int(os.environ.get("IMPORT_MAX_ROWS", "200000"))
+IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", "1000"))
+# Oldest importable year, counted back from the current one
+IMPORT_MAX_YEARS_BACK = int(os.environ.get("IMPORT_MAX_YEARS_BACK", "10"))
+
+# Streaming exports: documents fetched per Motor cursor batch
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))
+
+# Per-org, per-year holiday arrays used for working-day counts
+HOLIDAY_CACHE_SIZE = int(os.environ.get("HOLIDAY_CACHE_SIZE", "2000"))
+HOLIDAY_CACHE_TTL_SECONDS = float(os.environ.get("HOLIDAY_CACHE_TTL_SECONDS", "600"))
+
+# Background jobs: organizations processed in parallel
+ORG_JOB_CONCURRENCY = int(os.environ.get("ORG_JOB_CONCURRENCY", "8"))
+
+# Tenant metadata cache: leave types, organization, org settings
+METADATA_CACHE_SIZE = int(os.environ.get("METADATA_CACHE_SIZE", "5000"))
+METADATA_CACHE_TTL_SECONDS = float(os.environ.get("METADATA_CACHE_TTL_SECONDS", "300"))
+
+# Annual rollover: unused days of these leave types carry over to the next
+# year, up to this many days (org_settings.carry_over_max_days overrides it)
+CARRY_OVER_LEAVE_TYPES = [t for t in os.environ.get("CARRY_OVER_LEAVE_TYPES", "ferie").split(",") if t]
+CARRY_OVER_MAX_DAYS = float(os.environ.get("CARRY_OVER_MAX_DAYS", "26"))
+
+# In-process background jobs: documents written per batch, and how long
+# finished job records stay queryable
+JOB_CHUNK_SIZE = int(os.environ.get("JOB_CHUNK_SIZE", "1000"))
+JOB_RETENTION_HOURS = float(os.environ.get("JOB_RETENTION_HOURS", "24"))
+# Pause between cascade-delete batches, to leave the primary room for traffic
+CASCADE_DELETE_PAUSE_SECONDS = float(os.environ.get("CASCADE_DELETE_PAUSE_SECONDS", "0.05"))
+
+# Index audit at startup: "off", "report" (log flagged query shapes) or
+# "create" (also build their recommended indexes); see index_audit.py
+INDEX_AUDIT_ON_STARTUP = os.environ.get("INDEX_AUDIT_ON_STARTUP", "off")
+
+# Seconds between runs of the org_stats drift verifier (see org_stats.py)
+ORG_STATS_VERIFY_INTERVAL_SECONDS = float(os.environ.get("ORG_STATS_VERIFY_INTERVAL_SECONDS", "3600"))
+
+# Absence heatmaps, cached per (org, year) until the org's next write
+HEATMAP_CACHE_SIZE = int(os.environ.get("HEATMAP_CACHE_SIZE", "500"))
+HEATMAP_CACHE_TTL_SECONDS = float(os.environ.get("HEATMAP_CACHE_TTL_SECONDS", "300"))
+
+# Short-lived per-org cache of read responses, revalidated with ETags
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "5000"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "30"))
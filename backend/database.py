@@ -1,5 +1,6 @@
 import logging
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
 from config import MONGO_URL, DB_NAME
 
 logger = logging.getLogger("powerleave")
@@ -13,29 +14,84 @@ async def create_indexes():
     await db.users.create_index("user_id", unique=True)
     await db.organizations.create_index("org_id", unique=True)
     await db.leave_requests.create_index([("org_id", 1), ("user_id", 1)])
+    await db.leave_requests.create_index("id")
+    await db.closure_exceptions.create_index("id")
+    # Cascade deletes (see cascade.cascade_delete); user_id lookups on
+    # leave_requests and leave_balances use the compound indexes below
+    await db.leave_requests.create_index(
+        "closure_id", partialFilterExpression={"closure_id": {"$exists": True}}
+    )
+    await db.closure_exceptions.create_index("closure_id")
     await db.leave_requests.create_index([("org_id", 1), ("start_date", 1)])
+    await db.leave_requests.create_index([("org_id", 1), ("status", 1), ("start_date", 1)])
+    # Interval lookups for overlap checks (see overlap.OverlapChecker)
+    await db.leave_requests.create_index(
+        [("user_id", 1), ("status", 1), ("start_date", 1), ("end_date", 1)]
+    )
     await db.leave_types.create_index("org_id")
+    await db.leave_types.create_index("id")
+    await db.org_settings.create_index("org_id")
+    await db.company_closures.create_index([("org_id", 1), ("start_date", 1)])
+    await db.company_closures.create_index("id")
     await db.leave_balances.create_index([("org_id", 1), ("year", 1)])
     await db.announcements.create_index("org_id")
     await db.closure_exceptions.create_index("org_id")
+    # Keyset pagination (see pagination.Keyset)
+    await db.leave_requests.create_index([("org_id", 1), ("created_at", -1), ("id", -1)])
+    await db.leave_requests.create_index([("org_id", 1), ("user_id", 1), ("created_at", -1), ("id", -1)])
+    await db.leave_balances.create_index([("org_id", 1), ("year", 1), ("user_id", 1), ("leave_type_id", 1)])
+    await db.announcements.create_index([("org_id", 1), ("created_at", -1), ("id", -1)])
+    await db.closure_exceptions.create_index([("org_id", 1), ("created_at", -1), ("id", -1)])
+    await db.closure_exceptions.create_index([("org_id", 1), ("user_id", 1), ("created_at", -1), ("id", -1)])
+    await db.users.create_index([("org_id", 1), ("created_at", 1), ("user_id", 1)])
+    await db.user_sessions.create_index("session_id", unique=True)
+    await db.user_sessions.create_index("expires_at", expireAfterSeconds=0)
+    await db.rollover_runs.create_index([("org_id", 1), ("year", 1)], unique=True)
+    await db.jobs.create_index("id", unique=True)
+    await db.org_stats.create_index("org_id", unique=True)
+    await db.jobs.create_index("expires_at", expireAfterSeconds=0)
 
+    # One balance per (user, leave type, year): makes balance upserts
+    # race-free and backs the request-id ledger, so startup fails without it
+    try:
+        await _create_balance_key()
+    except OperationFailure as exc:
+        if exc.code != 11000:
+            raise
+        merged = await _merge_duplicate_balances()
+        logger.warning("Merged %d duplicate leave balances before creating the balance_key index", merged)
+        await _create_balance_key()
 
-async def init_leave_balances(user_id: str, org_id: str, year: int):
-    """Centralized helper to initialize leave balances for a new user.
-    Used by register, invite, and OAuth flows (resolves D08 duplication)."""
-    leave_types = await db.leave_types.find(
-        {"$or": [{"org_id": None}, {"org_id": org_id}]},
-        {"_id": 0}
-    ).to_list(100)
-    for lt in leave_types:
-        existing = await db.leave_balances.find_one({
-            "user_id": user_id, "org_id": org_id,
-            "leave_type_id": lt["id"], "year": year
-        })
-        if not existing:
-            await db.leave_balances.insert_one({
-                "user_id": user_id, "org_id": org_id,
-                "leave_type_id": lt["id"], "year": year,
-                "total_days": lt["days_per_year"],
-                "used_days": 0
-            })
+
+async def _create_balance_key():
+    await db.leave_balances.create_index(
+        [("user_id", 1), ("leave_type_id", 1), ("year", 1)],
+        unique=True, name="balance_key"
+    )
+
+
+async def _merge_duplicate_balances() -> int:
+    """Fold balances sharing a (user, leave type, year) key into the oldest
+    one: used days and ledgers add up (each deduction hit one of them), the
+    allowance is the largest. Returns the number of documents removed."""
+    removed = 0
+    async for group in db.leave_balances.aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "leave_type_id": "$leave_type_id", "year": "$year"},
+            "ids": {"$push": "$_id"},
+            "used_days": {"$sum": "$used_days"},
+            "total_days": {"$max": "$total_days"},
+            "ledgers": {"$push": {"$ifNull": ["$applied_request_ids", []]}},
+        }},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ], allowDiskUse=True):
+        keep, duplicates = group["ids"][0], group["ids"][1:]
+        ledger = list(dict.fromkeys(i for ids in group["ledgers"] for i in ids))
+        await db.leave_balances.update_one({"_id": keep}, {"$set": {
+            "used_days": group["used_days"],
+            "total_days": group["total_days"],
+            "applied_request_ids": ledger,
+        }})
+        removed += (await db.leave_balances.delete_many({"_id": {"$in": duplicates}})).deleted_count
+    return removed
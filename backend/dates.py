@@ -0,0 +1,20 @@
+from datetime import date, datetime
+from typing import Optional
+
+# Dates are stored as zero-padded YYYY-MM-DD strings, so that string order
+# is date order: range queries on start_date/end_date rely on it.
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def parse_date(value) -> Optional[date]:
+    """Date of a YYYY-MM-DD string (zero padding optional); None if invalid."""
+    try:
+        return datetime.strptime(str(value), DATE_FORMAT).date()
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_date(value) -> Optional[str]:
+    """Canonical zero-padded form of a date string; None if invalid."""
+    parsed = parse_date(value)
+    return parsed.isoformat() if parsed else None
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+logger = logging.getLogger("powerleave")
+
+
+class PasswordHasher:
+    """Runs bcrypt hashing/verification on a dedicated thread pool.
+
+    bcrypt releases the GIL, so the event loop keeps serving other requests
+    while a hash is computed. At most `max_queue` operations may be running
+    or waiting at any time; beyond that callers get a 503 instead of piling
+    up behind a login burst."""
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self._executor = None
+        self._pending = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="bcrypt"
+            )
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_queue:
+            logger.warning("Password hashing queue full (%d pending)", self._pending)
+            raise HTTPException(
+                status_code=503,
+                detail="Servizio temporaneamente sovraccarico, riprova tra poco"
+            )
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self._context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        if not hashed:
+            # OAuth-only accounts have no local password
+            return False
+        return await self._run(self._context.verify, password, hashed)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
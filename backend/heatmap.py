@@ -0,0 +1,121 @@
+from datetime import date
+from typing import Optional
+
+import numpy as np
+
+from cache import TTLCache
+from config import HEATMAP_CACHE_SIZE, HEATMAP_CACHE_TTL_SECONDS
+from database import db
+from dates import parse_date
+from metadata import tenant_metadata
+from versions import org_versions
+
+# User fields a heatmap can be broken down by
+GROUP_FIELDS = ["role"]
+
+
+class AbsenceHeatmap:
+    """Per-day counts of absent people over a year, per leave type and
+    optionally per user group.
+
+    Approved intervals are clipped to the year and turned into day indexes.
+    A user's intervals can overlap (closure auto-leave on top of a regular
+    request), so they are first merged per (series, user), and per user for
+    the total; a difference array then gets +1 at each start and -1 after
+    each end (one row per series, filled with np.add.at) and a cumulative
+    sum along the days yields the number of people absent on every day.
+    Results are cached per (org, year, group) and keyed by the org's change
+    version."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, name="heatmaps")
+
+    async def get(self, org_id: str, year: int, group_by: Optional[str] = None) -> dict:
+        key = (org_id, year, group_by, org_versions.get(org_id))
+        heatmap = self._cache.get(key)
+        if heatmap is None:
+            heatmap = await self._build(org_id, year, group_by)
+            self._cache.set(key, heatmap)
+        return heatmap
+
+    async def _build(self, org_id: str, year: int, group_by: Optional[str]) -> dict:
+        first, last = f"{year}-01-01", f"{year}-12-31"
+        n_days = (date(year + 1, 1, 1) - date(year, 1, 1)).days
+        requests = []
+        async for r in db.leave_requests.find(
+            {"org_id": org_id, "status": "approved", "start_date": {"$lte": last}, "end_date": {"$gte": first}},
+            {"_id": 0, "user_id": 1, "leave_type_id": 1, "start_date": 1, "end_date": 1}
+        ):
+            # Clip to the year on parsed dates; legacy rows that do not parse are skipped
+            start, end = parse_date(r.get("start_date")), parse_date(r.get("end_date"))
+            if start is None or end is None or end < start:
+                continue
+            r["start_date"] = max(start.isoformat(), first)
+            r["end_date"] = min(end.isoformat(), last)
+            if r["start_date"] <= r["end_date"]:
+                requests.append(r)
+
+        groups = {}
+        if group_by:
+            async for u in db.users.find({"org_id": org_id}, {"_id": 0, "user_id": 1, group_by: 1}):
+                groups[u["user_id"]] = u.get(group_by)
+
+        series_keys = [(r["leave_type_id"], groups.get(r["user_id"]) if group_by else None) for r in requests]
+        keys = sorted(set(series_keys), key=lambda k: (k[0], str(k[1])))
+        counts = np.zeros((len(keys), n_days), dtype=np.int64)
+        total = np.zeros(n_days, dtype=np.int64)
+        if requests:
+            row_of = {k: i for i, k in enumerate(keys)}
+            rows = np.array([row_of[k] for k in series_keys], dtype=np.int64)
+            user_of = {}
+            users = np.array([user_of.setdefault(r["user_id"], len(user_of)) for r in requests], dtype=np.int64)
+            year_start = np.datetime64(first, "D")
+            starts = np.array([r["start_date"] for r in requests], dtype="datetime64[D]")
+            ends = np.array([r["end_date"] for r in requests], dtype="datetime64[D]")
+            start_idx = (starts - year_start).astype(np.int64)
+            end_idx = (ends - year_start).astype(np.int64) + 1
+
+            owners, merged_start, merged_end = _merge_intervals(rows * len(user_of) + users, start_idx, end_idx)
+            counts = _coverage(owners // len(user_of), merged_start, merged_end, len(keys), n_days)
+            owners, merged_start, merged_end = _merge_intervals(users, start_idx, end_idx)
+            total = _coverage(np.zeros_like(owners), merged_start, merged_end, 1, n_days)[0]
+
+        names = {t["id"]: t["name"] for t in await tenant_metadata.leave_types(org_id)}
+        return {
+            "year": year,
+            "start_date": first,
+            "days": n_days,
+            "group_by": group_by,
+            "series": [
+                {"leave_type_id": type_id, "leave_type_name": names.get(type_id, type_id),
+                 "group": group, "counts": row.tolist()}
+                for (type_id, group), row in zip(keys, counts)
+            ],
+            "total": total.tolist(),
+        }
+
+
+def _merge_intervals(owners: np.ndarray, starts: np.ndarray, ends: np.ndarray):
+    """Union of each owner's half-open [start, end) intervals, so an owner
+    is counted once per day."""
+    merged_owners, merged_starts, merged_ends = [], [], []
+    for i in np.lexsort((starts, owners)).tolist():
+        owner, start, end = int(owners[i]), int(starts[i]), int(ends[i])
+        if merged_owners and merged_owners[-1] == owner and start <= merged_ends[-1]:
+            merged_ends[-1] = max(merged_ends[-1], end)
+        else:
+            merged_owners.append(owner)
+            merged_starts.append(start)
+            merged_ends.append(end)
+    return np.array(merged_owners), np.array(merged_starts), np.array(merged_ends)
+
+
+def _coverage(rows: np.ndarray, starts: np.ndarray, ends: np.ndarray, n_rows: int, n_days: int) -> np.ndarray:
+    """Per-row, per-day number of intervals covering the day."""
+    diff = np.zeros((n_rows, n_days + 1), dtype=np.int64)
+    np.add.at(diff, (rows, starts), 1)
+    np.add.at(diff, (rows, ends), -1)
+    return np.cumsum(diff, axis=1)[:, :n_days]
+
+
+absence_heatmap = AbsenceHeatmap(maxsize=HEATMAP_CACHE_SIZE, ttl=HEATMAP_CACHE_TTL_SECONDS)
@@ -0,0 +1,183 @@
+import logging
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from cache import TTLCache
+from config import HOLIDAY_CACHE_SIZE, HOLIDAY_CACHE_TTL_SECONDS
+from database import db
+from dates import normalize_date
+
+logger = logging.getLogger("powerleave")
+
+
+def easter_sunday(year: int) -> date:
+    """Gregorian Easter Sunday (anonymous Gregorian computus)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    weekday = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * weekday) // 451
+    month, day = divmod(h + weekday - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def national_holidays(year: int) -> List[Tuple[date, str]]:
+    """Italian national holidays of `year`, as (date, name) pairs."""
+    easter = easter_sunday(year)
+    return sorted([
+        (date(year, 1, 1), "Capodanno"),
+        (date(year, 1, 6), "Epifania"),
+        (easter, "Pasqua"),
+        (easter + timedelta(days=1), "Lunedì dell'Angelo"),
+        (date(year, 4, 25), "Festa della Liberazione"),
+        (date(year, 5, 1), "Festa dei Lavoratori"),
+        (date(year, 6, 2), "Festa della Repubblica"),
+        (date(year, 8, 15), "Ferragosto"),
+        (date(year, 11, 1), "Ognissanti"),
+        (date(year, 12, 8), "Immacolata Concezione"),
+        (date(year, 12, 25), "Natale"),
+        (date(year, 12, 26), "Santo Stefano"),
+    ])
+
+
+def _national_closures(year: int) -> List[dict]:
+    """National holidays shaped like company_closures documents."""
+    return [
+        {"id": f"national-{day.isoformat()}", "org_id": None,
+         "start_date": day.isoformat(), "end_date": day.isoformat(),
+         "reason": name, "type": "holiday"}
+        for day, name in national_holidays(year)
+    ]
+
+
+class YearCalendar:
+    """Closed days of one organization in one year.
+
+    `closed` and `holiday` are day-of-year bitsets (numpy bool arrays):
+    `closed` covers every closure, `holiday` only those of type "holiday"
+    (shutdowns are days on which employees take leave, not holidays).
+    A prefix sum over `closed` answers range counts in O(1)."""
+
+    def __init__(self, year: int, closures: List[dict]):
+        self.year = year
+        self.first = date(year, 1, 1)
+        size = (date(year + 1, 1, 1) - self.first).days
+        self.closed = np.zeros(size, dtype=bool)
+        self.holiday = np.zeros(size, dtype=bool)
+        for c in closures:
+            start = max(self._index(c["start_date"]), 0)
+            end = min(self._index(c.get("end_date") or c["start_date"]), size - 1)
+            if start > end:
+                continue
+            self.closed[start:end + 1] = True
+            if c.get("type") == "holiday":
+                self.holiday[start:end + 1] = True
+        self._closed_prefix = np.concatenate(([0], np.cumsum(self.closed)))
+        self.holiday_dates = np.datetime64(self.first, "D") + np.flatnonzero(self.holiday)
+        self.closures = sorted(closures, key=lambda c: c["start_date"])
+
+    def _index(self, day: str) -> int:
+        return (date.fromisoformat(day) - self.first).days
+
+    def is_closed(self, day: str) -> bool:
+        return bool(self.closed[self._index(day)])
+
+    def closed_days(self, start: str, end: str) -> int:
+        """Closed days in [start, end], both within this year."""
+        return int(self._closed_prefix[self._index(end) + 1] - self._closed_prefix[self._index(start)])
+
+
+class HolidayCalendar:
+    """Per-org holiday and closure calendar.
+
+    National holidays are generated for any year; they are merged with the
+    organization's (and global) `company_closures` into a YearCalendar that
+    is cached per (org, year), so calendar views and working-day counts do
+    not query MongoDB on every navigation. Closure writes on this worker
+    call `invalidate`; other workers catch up within the cache TTL."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, name="holidays")
+
+    async def year(self, org_id: str, year: int) -> YearCalendar:
+        key = (org_id, year)
+        calendar = self._cache.get(key)
+        if calendar is None:
+            calendar = YearCalendar(year, await self._load_closures(org_id, year))
+            self._cache.set(key, calendar)
+        return calendar
+
+    async def _load_closures(self, org_id: str, year: int) -> List[dict]:
+        national = _national_closures(year)
+        stored = await db.company_closures.find(
+            {"$or": [{"org_id": None}, {"org_id": org_id}],
+             "start_date": {"$lte": f"{year}-12-31"},
+             "end_date": {"$gte": f"{year}-01-01"}},
+            {"_id": 0}
+        ).to_list(None)
+        return national + _valid_closures(stored, {c["start_date"] for c in national})
+
+    async def all_closures(self, org_id: str, year: int) -> List[dict]:
+        """Every stored closure of the org (and global ones) plus the
+        national holidays of `year`, sorted by start date."""
+        national = _national_closures(year)
+        stored = await db.company_closures.find(
+            {"$or": [{"org_id": None}, {"org_id": org_id}]}, {"_id": 0}
+        ).sort("start_date", 1).to_list(500)
+        closures = national + _valid_closures(stored, {c["start_date"] for c in national})
+        return sorted(closures, key=lambda c: c["start_date"])
+
+    async def is_closed(self, org_id: str, day: str) -> bool:
+        return (await self.year(org_id, int(day[:4]))).is_closed(day)
+
+    async def closures(self, org_id: str, start: str, end: str) -> List[dict]:
+        """Closures overlapping [start, end], sorted by start date."""
+        seen, result = set(), []
+        for year in range(int(start[:4]), int(end[:4]) + 1):
+            for c in (await self.year(org_id, year)).closures:
+                if c["id"] in seen or c["start_date"] > end or (c.get("end_date") or c["start_date"]) < start:
+                    continue
+                seen.add(c["id"])
+                result.append(dict(c))
+        return result
+
+    async def holiday_dates(self, org_id: str, first_year: int, last_year: int) -> np.ndarray:
+        """Holidays of the given years as a sorted datetime64[D] array."""
+        return np.concatenate([
+            (await self.year(org_id, y)).holiday_dates for y in range(first_year, last_year + 1)
+        ])
+
+    def invalidate(self, org_id: Optional[str] = None):
+        """Drop the org's cached years; org None (global closures) drops all."""
+        if org_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop_matching(lambda key: key[0] == org_id)
+
+
+def _valid_closures(stored: List[dict], national_days: set) -> List[dict]:
+    """Stored closures with zero-padded dates. Documents with unparseable
+    or reversed dates are logged and skipped, and global holiday documents
+    seeded by older versions that duplicate a generated national holiday
+    are dropped."""
+    valid = []
+    for c in stored:
+        start = normalize_date(c.get("start_date"))
+        end = normalize_date(c.get("end_date") or c.get("start_date"))
+        if start is None or end is None or end < start:
+            logger.warning("Skipping closure %s with invalid dates %r..%r",
+                           c.get("id"), c.get("start_date"), c.get("end_date"))
+            continue
+        if c.get("org_id") is None and c.get("type") == "holiday" and start == end and start in national_days:
+            continue
+        valid.append({**c, "start_date": start, "end_date": end})
+    return valid
+
+
+holiday_calendar = HolidayCalendar(maxsize=HOLIDAY_CACHE_SIZE, ttl=HOLIDAY_CACHE_TTL_SECONDS)
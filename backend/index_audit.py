@@ -0,0 +1,219 @@
+"""
+Index audit.
+
+Runs `explain()` on the query shapes issued by the routes and jobs against
+the live database and reports the ones that scan the whole collection, sort
+in memory or examine far more keys/documents than they return. With
+--create the recommended index of every flagged shape is built.
+
+Run: python index_audit.py [--create]   (exit status 1 if problems remain)
+Startup: INDEX_AUDIT_ON_STARTUP=report|create
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+
+from database import db
+
+logger = logging.getLogger("powerleave")
+
+# Flag a plan examining more than POOR_RATIO keys/docs per returned
+# document, once it examines at least MIN_EXAMINED of them
+POOR_RATIO = 10
+MIN_EXAMINED = 100
+
+
+class QueryShape:
+    """A find issued by the application: `filter` builds the query from
+    sample parameters (org_id, user_id, today, ...) and `index` is the index
+    that serves it."""
+
+    def __init__(self, name: str, collection: str, filter: Callable[[dict], dict],
+                 index: List[Tuple[str, int]], sort: Optional[List[Tuple[str, int]]] = None,
+                 index_options: Optional[dict] = None):
+        self.name = name
+        self.collection = collection
+        self.filter = filter
+        self.index = index
+        self.sort = sort
+        self.index_options = index_options or {}
+
+
+ACTIVE = ["pending", "approved"]
+
+QUERY_SHAPES = [
+    # auth.py, routes/auth.py, tokens.py
+    QueryShape("users.by_email", "users", lambda p: {"email": p["email"]}, [("email", 1)]),
+    QueryShape("users.by_user_id", "users", lambda p: {"user_id": p["user_id"]}, [("user_id", 1)]),
+    QueryShape("user_sessions.by_session_id", "user_sessions",
+               lambda p: {"session_id": p["session_id"]}, [("session_id", 1)]),
+    # routes/team.py
+    QueryShape("users.team_page", "users", lambda p: {"org_id": p["org_id"]},
+               [("org_id", 1), ("created_at", 1), ("user_id", 1)],
+               sort=[("created_at", 1), ("user_id", 1)]),
+    # metadata.py, routes/organization.py
+    QueryShape("organizations.by_org_id", "organizations", lambda p: {"org_id": p["org_id"]}, [("org_id", 1)]),
+    QueryShape("org_settings.by_org_id", "org_settings", lambda p: {"org_id": p["org_id"]}, [("org_id", 1)]),
+    QueryShape("leave_types.for_org", "leave_types",
+               lambda p: {"$or": [{"org_id": None}, {"org_id": p["org_id"]}]}, [("org_id", 1)]),
+    QueryShape("leave_types.by_id", "leave_types", lambda p: {"id": "ferie"}, [("id", 1)]),
+    # routes/leave.py
+    QueryShape("leave_requests.page", "leave_requests", lambda p: {"org_id": p["org_id"]},
+               [("org_id", 1), ("created_at", -1), ("id", -1)], sort=[("created_at", -1), ("id", -1)]),
+    QueryShape("leave_requests.user_page", "leave_requests",
+               lambda p: {"org_id": p["org_id"], "user_id": p["user_id"]},
+               [("org_id", 1), ("user_id", 1), ("created_at", -1), ("id", -1)],
+               sort=[("created_at", -1), ("id", -1)]),
+    QueryShape("leave_requests.by_id", "leave_requests",
+               lambda p: {"id": p["request_id"], "org_id": p["org_id"]}, [("id", 1)]),
+    # overlap.py
+    QueryShape("leave_requests.overlap", "leave_requests",
+               lambda p: {"user_id": p["user_id"], "status": {"$in": ACTIVE},
+                          "start_date": {"$lte": p["today"]}, "end_date": {"$gte": p["today"]}},
+               [("user_id", 1), ("status", 1), ("start_date", 1), ("end_date", 1)]),
+    # routes/calendar.py
+    QueryShape("leave_requests.calendar", "leave_requests",
+               lambda p: {"org_id": p["org_id"], "status": {"$in": ACTIVE},
+                          "start_date": {"$lt": p["month_end"]}, "end_date": {"$gte": p["month_start"]}},
+               [("org_id", 1), ("status", 1), ("start_date", 1)]),
+    # routes/export.py
+    QueryShape("leave_requests.export", "leave_requests",
+               lambda p: {"org_id": p["org_id"], "start_date": {"$lte": p["today"]}},
+               [("org_id", 1), ("start_date", 1)]),
+    # cascade.py, closure_leave.py
+    QueryShape("leave_requests.by_closure", "leave_requests", lambda p: {"closure_id": p["closure_id"]},
+               [("closure_id", 1)], index_options={"partialFilterExpression": {"closure_id": {"$exists": True}}}),
+    QueryShape("leave_balances.by_user", "leave_balances", lambda p: {"user_id": p["user_id"]},
+               [("user_id", 1), ("leave_type_id", 1), ("year", 1)]),
+    QueryShape("leave_balances.page", "leave_balances",
+               lambda p: {"org_id": p["org_id"], "year": p["year"]},
+               [("org_id", 1), ("year", 1), ("user_id", 1), ("leave_type_id", 1)],
+               sort=[("user_id", 1), ("leave_type_id", 1)]),
+    # holidays.py, routes/closures.py
+    QueryShape("company_closures.for_org_year", "company_closures",
+               lambda p: {"$or": [{"org_id": None}, {"org_id": p["org_id"]}],
+                          "start_date": {"$lte": f"{p['year']}-12-31"},
+                          "end_date": {"$gte": f"{p['year']}-01-01"}},
+               [("org_id", 1), ("start_date", 1)]),
+    QueryShape("company_closures.by_id", "company_closures",
+               lambda p: {"id": p["closure_id"], "org_id": p["org_id"]}, [("id", 1)]),
+    QueryShape("closure_exceptions.page", "closure_exceptions", lambda p: {"org_id": p["org_id"]},
+               [("org_id", 1), ("created_at", -1), ("id", -1)], sort=[("created_at", -1), ("id", -1)]),
+    QueryShape("closure_exceptions.by_closure", "closure_exceptions",
+               lambda p: {"closure_id": p["closure_id"], "status": "approved"}, [("closure_id", 1)]),
+    QueryShape("closure_exceptions.by_id", "closure_exceptions",
+               lambda p: {"id": p["request_id"], "org_id": p["org_id"]}, [("id", 1)]),
+    # org_stats.py, routes/stats.py
+    QueryShape("org_stats.by_org_id", "org_stats", lambda p: {"org_id": p["org_id"]}, [("org_id", 1)],
+               index_options={"unique": True}),
+    QueryShape("leave_requests.on_leave_today", "leave_requests",
+               lambda p: {"org_id": p["org_id"], "status": "approved",
+                          "start_date": {"$lte": p["today"]}, "end_date": {"$gte": p["today"]}},
+               [("org_id", 1), ("status", 1), ("start_date", 1)]),
+    # routes/announcements.py
+    QueryShape("announcements.page", "announcements", lambda p: {"org_id": p["org_id"]},
+               [("org_id", 1), ("created_at", -1), ("id", -1)], sort=[("created_at", -1), ("id", -1)]),
+    # jobs.py
+    QueryShape("jobs.by_id", "jobs", lambda p: {"id": p["request_id"], "org_id": p["org_id"]}, [("id", 1)]),
+]
+
+
+async def _sample_params() -> dict:
+    """Parameter values taken from real documents, so plans and counters
+    reflect the data the routes actually query."""
+    user = await db.users.find_one({}, {"_id": 0, "org_id": 1, "user_id": 1, "email": 1}) or {}
+    closure = await db.company_closures.find_one({"org_id": {"$ne": None}}, {"_id": 0, "id": 1}) or {}
+    request = await db.leave_requests.find_one({}, {"_id": 0, "id": 1}) or {}
+    now = datetime.now(timezone.utc)
+    return {
+        "org_id": user.get("org_id", "org_audit"),
+        "user_id": user.get("user_id", "user_audit"),
+        "email": user.get("email", "audit@example.com"),
+        "closure_id": closure.get("id", "closure_audit"),
+        "request_id": request.get("id", "request_audit"),
+        "session_id": "session_audit",
+        "year": now.year,
+        "today": now.strftime("%Y-%m-%d"),
+        "month_start": now.strftime("%Y-%m-01"),
+        "month_end": f"{now.year + now.month // 12}-{now.month % 12 + 1:02d}-01",
+    }
+
+
+def _plan_stages(plan: dict) -> List[dict]:
+    stages = [plan]
+    for child in [plan.get("inputStage")] + plan.get("inputStages", []):
+        if child:
+            stages.extend(_plan_stages(child))
+    return stages
+
+
+async def explain_shape(shape: QueryShape, params: dict) -> dict:
+    cursor = db[shape.collection].find(shape.filter(params))
+    if shape.sort:
+        cursor = cursor.sort(shape.sort)
+    explain = await cursor.explain()
+
+    winning = explain["queryPlanner"]["winningPlan"]
+    stages = _plan_stages(winning.get("queryPlan", winning))
+    names = {s["stage"] for s in stages}
+    stats = explain.get("executionStats", {})
+    keys = stats.get("totalKeysExamined", 0)
+    docs = stats.get("totalDocsExamined", 0)
+    returned = stats.get("nReturned", 0)
+
+    problems = []
+    if "COLLSCAN" in names:
+        problems.append("collection scan")
+    if shape.sort and "SORT" in names:
+        problems.append("in-memory sort")
+    examined = max(keys, docs)
+    if examined >= MIN_EXAMINED and examined > POOR_RATIO * max(returned, 1):
+        problems.append(f"{examined} keys/docs examined for {returned} returned")
+
+    return {
+        "name": shape.name,
+        "collection": shape.collection,
+        "indexes": sorted({s["indexName"] for s in stages if s.get("indexName")}),
+        "keys_examined": keys,
+        "docs_examined": docs,
+        "returned": returned,
+        "problems": problems,
+    }
+
+
+async def audit_indexes(create: bool = False) -> List[dict]:
+    """Explain every registered query shape; with `create`, build the
+    recommended index of the flagged ones and explain them again."""
+    params = await _sample_params()
+    reports = []
+    for shape in QUERY_SHAPES:
+        report = await explain_shape(shape, params)
+        if report["problems"] and create:
+            name = await db[shape.collection].create_index(shape.index, **shape.index_options)
+            logger.info("Index audit: created %s.%s for %s", shape.collection, name, shape.name)
+            report = await explain_shape(shape, params)
+        if report["problems"]:
+            logger.warning("Index audit: %s: %s", shape.name, "; ".join(report["problems"]))
+        reports.append(report)
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Explain the application's query shapes")
+    parser.add_argument("--create", action="store_true", help="Create the recommended index of flagged shapes")
+    parser.add_argument("--all", action="store_true", help="Also print shapes without problems")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    reports = asyncio.run(audit_indexes(create=args.create))
+    flagged = [r for r in reports if r["problems"]]
+    print(json.dumps(reports if args.all else flagged, indent=2))
+    raise SystemExit(1 if flagged else 0)
+
+
+if __name__ == "__main__":
+    main()
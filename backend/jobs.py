@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from config import JOB_RETENTION_HOURS
+from database import db
+
+logger = logging.getLogger("powerleave")
+
+
+class Job:
+    """Handle passed to a running job to report its progress."""
+
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.processed = 0
+
+    async def progress(self, processed: int = 0, total: Optional[int] = None):
+        """Add `processed` items to the count (and optionally set the total)."""
+        self.processed += processed
+        update = {"processed": self.processed, "updated_at": datetime.now(timezone.utc)}
+        if total is not None:
+            update["total"] = total
+        await db.jobs.update_one({"id": self.id}, {"$set": update})
+
+
+class JobRunner:
+    """Runs slow admin operations as asyncio tasks on the current worker.
+
+    State lives in the `jobs` collection so any worker can answer status
+    queries; finished records expire after JOB_RETENTION_HOURS through a
+    TTL index on expires_at, which is only set when a job ends so a running
+    job is never removed. Jobs are not resumed after a restart: the ones
+    interrupted by shutdown are marked failed."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._tasks = {}
+
+    async def start(
+        self, kind: str, org_id: str, created_by: str,
+        work: Callable[[Job], Awaitable[Optional[dict]]]
+    ) -> str:
+        job = Job(str(uuid.uuid4()))
+        now = datetime.now(timezone.utc)
+        await self.collection.insert_one({
+            "id": job.id,
+            "kind": kind,
+            "org_id": org_id,
+            "created_by": created_by,
+            "status": "running",
+            "processed": 0,
+            "total": None,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        })
+        task = asyncio.create_task(self._run(job, work))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job.id
+
+    async def _run(self, job: Job, work):
+        try:
+            result = await work(job)
+            await self._finish(job, "completed", result=result)
+        except asyncio.CancelledError:
+            await self._finish(job, "failed", error="Interrotto dal riavvio del server")
+            raise
+        except Exception as exc:
+            logger.exception("Job %s failed", job.id)
+            await self._finish(job, "failed", error=str(exc))
+
+    async def _finish(self, job: Job, status: str, result: dict = None, error: str = None):
+        now = datetime.now(timezone.utc)
+        await self.collection.update_one({"id": job.id}, {"$set": {
+            "status": status,
+            "processed": job.processed,
+            "result": result,
+            "error": error,
+            "updated_at": now,
+            "expires_at": now + timedelta(hours=JOB_RETENTION_HOURS),
+        }})
+
+    async def get(self, job_id: str, org_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"id": job_id, "org_id": org_id}, {"_id": 0})
+
+    async def shutdown(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+job_runner = JobRunner(db.jobs)
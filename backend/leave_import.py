@@ -0,0 +1,189 @@
+import csv
+import io
+import json
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+from config import IMPORT_CHUNK_SIZE, IMPORT_MAX_YEARS_BACK
+from balances import apply_balance_deltas
+from database import db
+from metadata import tenant_metadata
+from org_stats import org_stats
+from overlap import overlap_checker, ACTIVE_STATUSES
+from versions import org_versions
+from workdays import working_days
+
+IMPORT_STATUSES = ["approved", "pending", "rejected"]
+
+
+def parse_rows(body: bytes, fmt: str) -> List[Tuple[int, object]]:
+    """Split an upload into (row_number, dict-or-error) pairs.
+    `fmt` is "csv" (header row required) or "ndjson" (one object per line)."""
+    text = body.decode("utf-8-sig")
+    rows = []
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(io.StringIO(text)), start=1):
+            rows.append((number, {k.strip(): (v or "").strip() for k, v in row.items() if k}))
+        return rows
+
+    number = 0
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(line)
+        except ValueError:
+            rows.append((number, "JSON non valido"))
+            continue
+        rows.append((number, row if isinstance(row, dict) else "Riga non è un oggetto JSON"))
+    return rows
+
+
+async def import_leave_requests(org_id: str, admin: dict, rows: List[Tuple[int, object]]) -> dict:
+    """Validate and insert historical leave requests for an organization.
+
+    Users and leave types are resolved with one query each, working days
+    are counted in one vectorized call, overlaps are checked for the whole
+    batch in memory, rows are written with insert_many in chunks and the
+    used days of approved rows are applied to balances with a single
+    bulk_write."""
+    errors = []
+
+    wanted_ids = {str(r["user_id"]) for _, r in rows if isinstance(r, dict) and r.get("user_id")}
+    wanted_emails = {str(r["email"]).lower() for _, r in rows if isinstance(r, dict) and r.get("email")}
+    by_id, by_email = {}, {}
+    if wanted_ids or wanted_emails:
+        async for u in db.users.find(
+            {"org_id": org_id, "$or": [
+                {"user_id": {"$in": list(wanted_ids)}},
+                {"email": {"$in": list(wanted_emails)}}
+            ]},
+            {"_id": 0, "user_id": 1, "email": 1, "name": 1}
+        ):
+            by_id[u["user_id"]] = u
+            by_email[u["email"].lower()] = u
+
+    leave_types = {t["id"]: t for t in await tenant_metadata.leave_types(org_id)}
+
+    now = datetime.now(timezone.utc)
+    # Same future limit as new requests; each year spanned costs a calendar load
+    min_date = datetime(now.year - IMPORT_MAX_YEARS_BACK, 1, 1)
+    max_date = now.replace(year=now.year + 2, hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    candidates = []
+    for number, row in rows:
+        if not isinstance(row, dict):
+            errors.append({"row": number, "error": row})
+            continue
+
+        user = by_id.get(str(row.get("user_id") or "")) or by_email.get(str(row.get("email") or "").lower())
+        if not user:
+            errors.append({"row": number, "error": "Utente non trovato"})
+            continue
+
+        leave_type = leave_types.get(str(row.get("leave_type_id") or ""))
+        if not leave_type:
+            errors.append({"row": number, "error": "Tipo di assenza non trovato"})
+            continue
+
+        start_date = str(row.get("start_date") or "")
+        end_date = str(row.get("end_date") or start_date)
+        try:
+            start = datetime.strptime(start_date, "%Y-%m-%d")
+            end = datetime.strptime(end_date, "%Y-%m-%d")
+        except ValueError:
+            errors.append({"row": number, "error": "Formato data non valido. Usa YYYY-MM-DD"})
+            continue
+        # Store the zero-padded form: range queries compare dates as strings
+        start_date, end_date = start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+        if end < start:
+            errors.append({"row": number, "error": "La data di fine deve essere uguale o successiva alla data di inizio"})
+            continue
+        if start < min_date:
+            errors.append({"row": number, "error": f"Le date non possono essere precedenti al {min_date.year}"})
+            continue
+        if end > max_date:
+            errors.append({"row": number, "error": "Le date non possono essere oltre 2 anni nel futuro"})
+            continue
+
+        status = str(row.get("status") or "approved")
+        if status not in IMPORT_STATUSES:
+            errors.append({"row": number, "error": "Stato non valido"})
+            continue
+
+        hours = row.get("hours")
+        try:
+            hours = 8 if hours is None or hours == "" else int(hours)
+        except (TypeError, ValueError):
+            errors.append({"row": number, "error": "Ore non valide"})
+            continue
+        if not 1 <= hours <= 8:
+            errors.append({"row": number, "error": "Ore non valide (1-8)"})
+            continue
+
+        doc = {
+            "id": str(uuid.uuid4()),
+            "user_id": user["user_id"],
+            "user_name": user["name"],
+            "org_id": org_id,
+            "leave_type_id": leave_type["id"],
+            "leave_type_name": leave_type["name"],
+            "start_date": start_date,
+            "end_date": end_date,
+            "days": 0,
+            "hours": hours,
+            "notes": str(row.get("notes") or ""),
+            "status": status,
+            "created_at": now,
+            "imported": True,
+        }
+        if status != "pending":
+            doc["reviewed_by"] = admin["user_id"]
+            doc["reviewed_at"] = now
+        candidates.append((number, doc))
+
+    day_counts = await working_days.count_many(
+        org_id, [d["start_date"] for _, d in candidates], [d["end_date"] for _, d in candidates]
+    )
+    counted = []
+    for (number, doc), days in zip(candidates, day_counts.tolist()):
+        if days == 0:
+            errors.append({"row": number, "error": "Il periodo non contiene giorni lavorativi"})
+            continue
+        doc["days"] = days
+        counted.append((number, doc))
+    candidates = counted
+
+    active = [(n, d) for n, d in candidates if d["status"] in ACTIVE_STATUSES]
+    conflicts = await overlap_checker.check_many(
+        [(d["user_id"], d["start_date"], d["end_date"]) for _, d in active],
+        refresh=True
+    )
+    rejected_rows = set()
+    for (number, _), conflict in zip(active, conflicts):
+        if conflict:
+            rejected_rows.add(number)
+            errors.append({"row": number, "error": "Periodo sovrapposto a una richiesta esistente"})
+
+    docs = [d for n, d in candidates if n not in rejected_rows]
+    for i in range(0, len(docs), IMPORT_CHUNK_SIZE):
+        await db.leave_requests.insert_many(docs[i:i + IMPORT_CHUNK_SIZE], ordered=False)
+
+    deltas = defaultdict(float)
+    for d in docs:
+        if d["status"] == "approved":
+            deltas[(d["user_id"], d["leave_type_id"], int(d["start_date"][:4]))] += d["days"] * (d["hours"] / 8)
+    await apply_balance_deltas(
+        org_id, deltas, {t["id"]: t["days_per_year"] for t in leave_types.values()}
+    )
+
+    await org_stats.requests_added(org_id, docs)
+    org_versions.bump(org_id)
+
+    for user_id in {d["user_id"] for d in docs}:
+        overlap_checker.invalidate(user_id)
+
+    errors.sort(key=lambda e: e["row"])
+    return {"total_rows": len(rows), "imported": len(docs), "errors": errors}
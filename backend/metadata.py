@@ -0,0 +1,77 @@
+import copy
+from collections import defaultdict
+from typing import Optional
+
+from cache import TTLCache
+from config import METADATA_CACHE_SIZE, METADATA_CACHE_TTL_SECONDS
+from database import db
+
+_MISSING = object()
+
+
+class TenantMetadataCache:
+    """Per-org cache of rarely changing tenant data: leave types (global
+    plus custom), the organization document and org_settings.
+
+    Every org has a version number that is part of the cache key; write
+    handlers call `invalidate(org_id)` to bump it, which orphans all of the
+    org's entries at once. Global leave types are versioned under org None
+    and that version is part of every leave-types key. Callers receive
+    copies, so they may mutate the results freely."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, name="tenant_metadata")
+        self._versions = defaultdict(int)
+
+    def _key(self, kind: str, org_id: Optional[str]):
+        version = self._versions[org_id]
+        if kind == "leave_types":
+            return kind, org_id, version, self._versions[None]
+        return kind, org_id, version
+
+    async def _get(self, kind: str, org_id: Optional[str], load):
+        key = self._key(kind, org_id)
+        value = self._cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = await load()
+            self._cache.set(key, value)
+        return copy.deepcopy(value)
+
+    async def leave_types(self, org_id: str) -> list:
+        return await self._get("leave_types", org_id, lambda: db.leave_types.find(
+            {"$or": [{"org_id": None}, {"org_id": org_id}]},
+            {"_id": 0}
+        ).to_list(100))
+
+    async def leave_type(self, org_id: str, type_id: str) -> Optional[dict]:
+        """One leave type; an id missing from the cached list is looked up
+        in the database, since it may have been created on another worker,
+        and when found the org's cached list is dropped."""
+        for leave_type in await self.leave_types(org_id):
+            if leave_type["id"] == type_id:
+                return leave_type
+        leave_type = await db.leave_types.find_one(
+            {"id": type_id, "$or": [{"org_id": None}, {"org_id": org_id}]},
+            {"_id": 0}
+        )
+        if leave_type is not None:
+            self._cache.pop(self._key("leave_types", org_id))
+        return leave_type
+
+    async def organization(self, org_id: str) -> Optional[dict]:
+        return await self._get("organization", org_id, lambda: db.organizations.find_one(
+            {"org_id": org_id}, {"_id": 0}
+        ))
+
+    async def settings(self, org_id: str) -> Optional[dict]:
+        return await self._get("settings", org_id, lambda: db.org_settings.find_one(
+            {"org_id": org_id}, {"_id": 0}
+        ))
+
+    def invalidate(self, org_id: Optional[str]):
+        """Bump the org's version; org None invalidates global leave types
+        for every organization."""
+        self._versions[org_id] += 1
+
+
+tenant_metadata = TenantMetadataCache(maxsize=METADATA_CACHE_SIZE, ttl=METADATA_CACHE_TTL_SECONDS)
@@ -107,6 +107,7 @@ class CompanyClosure(BaseModel):
     allow_exceptions: Optional[bool] = True
     created_at: Optional[Any] = None
     created_by: Optional[str] = None
+    job_id: Optional[str] = None
 
 
 class ClosureException(BaseModel):
@@ -151,6 +152,7 @@ class OrgSettings(BaseModel):
     max_consecutive_days: int = 15
     auto_approve_under_days: int = 0
     blocked_periods: List[str] = []
+    carry_over_max_days: Optional[float] = None
 
 
 class StatsResponse(BaseModel):
@@ -178,6 +180,70 @@ class LeaveRequestCreatedResponse(BaseModel):
     request_id: str
 
 
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+
+class LeaveImportResponse(BaseModel):
+    success: bool = True
+    total_rows: int
+    imported: int
+    errors: List[ImportRowError] = []
+
+
+class BulkReviewItem(BaseModel):
+    id: str
+    result: str
+
+
+class BulkReviewResponse(BaseModel):
+    success: bool = True
+    updated: int
+    results: List[BulkReviewItem] = []
+
+
+class RecomputeDaysResponse(BaseModel):
+    success: bool = True
+    scanned: int
+    updated: int
+    skipped: int = 0
+    reconciled: int = 0
+
+
+class JobStatus(BaseModel):
+    id: str
+    kind: str
+    status: str
+    processed: int = 0
+    total: Optional[int] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: Optional[Any] = None
+    updated_at: Optional[Any] = None
+
+
+class JobStartedResponse(BaseModel):
+    success: bool = True
+    job_id: str
+
+
+class HeatmapSeries(BaseModel):
+    leave_type_id: str
+    leave_type_name: str
+    group: Optional[str] = None
+    counts: List[int]
+
+
+class AbsenceHeatmapResponse(BaseModel):
+    year: int
+    start_date: str
+    days: int
+    group_by: Optional[str] = None
+    series: List[HeatmapSeries]
+    total: List[int]
+
+
 class InviteResponse(BaseModel):
     success: bool = True
     user_id: str
@@ -0,0 +1,183 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from config import ORG_JOB_CONCURRENCY, ORG_STATS_VERIFY_INTERVAL_SECONDS
+from database import db, logger
+
+COUNTED_STATUSES = ("approved", "pending")
+REBUILD_ATTEMPTS = 3
+VERIFIER_LEASE = "org_stats_verifier"
+
+
+def _year(leave_request: dict) -> str:
+    return leave_request["start_date"][:4]
+
+
+class OrgStatsCounters:
+    """Materialized dashboard counters, one `org_stats` document per org:
+
+        {"org_id": ..., "years": {"2026": {"approved": 12, "pending": 3,
+                                           "used_days": 40.5, "total_days": 520}}}
+
+    Request counts are keyed by the year the leave starts in, balance sums
+    by balance year. Write paths keep them current with atomic $inc updates
+    that also bump the document's `rev`; `rebuild` recomputes an org from
+    scratch and the periodic verifier uses it to correct drift (rollover,
+    reconciliation, crashed writers).
+
+    Updates never create the document: only `rebuild` does, and it marks it
+    `complete`, so an org without one is rebuilt on the next read instead of
+    showing counters that started mid-history."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def inc(self, org_id: str, changes: dict):
+        """Apply {(year, field): delta} to the org's counters."""
+        inc = {f"years.{year}.{field}": delta for (year, field), delta in changes.items() if delta}
+        if inc:
+            await self.collection.update_one({"org_id": org_id}, {"$inc": {**inc, "rev": 1}})
+
+    async def requests_added(self, org_id: str, leave_requests: Iterable[dict]):
+        changes = defaultdict(int)
+        for r in leave_requests:
+            if r["status"] in COUNTED_STATUSES:
+                changes[(_year(r), r["status"])] += 1
+        await self.inc(org_id, changes)
+
+    async def requests_deleted(self, org_id: str, leave_requests: Iterable[dict]):
+        changes = defaultdict(int)
+        for r in leave_requests:
+            if r["status"] in COUNTED_STATUSES:
+                changes[(_year(r), r["status"])] -= 1
+        await self.inc(org_id, changes)
+
+    @staticmethod
+    def reviewed_changes(leave_requests: Iterable[dict], status: str) -> dict:
+        """Counter changes moving reviewed requests out of pending."""
+        changes = defaultdict(int)
+        for r in leave_requests:
+            changes[(_year(r), "pending")] -= 1
+            if status in COUNTED_STATUSES:
+                changes[(_year(r), status)] += 1
+        return changes
+
+    async def request_reviewed(self, org_id: str, leave_requests: Iterable[dict], status: str):
+        await self.inc(org_id, self.reviewed_changes(leave_requests, status))
+
+    async def balances_deleted(self, org_id: str, balances: Iterable[dict]):
+        changes = defaultdict(float)
+        for b in balances:
+            changes[(str(b["year"]), "used_days")] -= b.get("used_days", 0)
+            changes[(str(b["year"]), "total_days")] -= b.get("total_days", 0)
+        await self.inc(org_id, changes)
+
+    async def get(self, org_id: str) -> dict:
+        doc = await self.collection.find_one({"org_id": org_id}, {"_id": 0})
+        return doc if doc is not None and doc.get("complete") else await self.rebuild(org_id)
+
+    async def rebuild(self, org_id: str) -> dict:
+        """Recompute the org's counters and store them unless an update
+        landed during the aggregation (the `rev` moved); then retry, and
+        after REBUILD_ATTEMPTS return the result without storing it."""
+        for _ in range(REBUILD_ATTEMPTS):
+            # Create a placeholder if missing, so concurrent updates bump its rev
+            try:
+                stored = await self.collection.find_one_and_update(
+                    {"org_id": org_id},
+                    {"$setOnInsert": {"rev": 0, "complete": False, "years": {}}},
+                    projection={"_id": 0, "rev": 1},
+                    upsert=True, return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                continue
+            rev = stored.get("rev")
+            doc = {"org_id": org_id, "rev": rev or 0, "complete": True,
+                   "years": await self._aggregate(org_id)}
+            result = await self.collection.replace_one({"org_id": org_id, "rev": rev}, doc)
+            if result.matched_count:
+                return doc
+        logger.warning("org_stats: %s kept changing during rebuild; counters not stored", org_id)
+        return doc
+
+    async def _aggregate(self, org_id: str) -> dict:
+        years = defaultdict(lambda: {"approved": 0, "pending": 0, "used_days": 0, "total_days": 0})
+        async for g in db.leave_requests.aggregate([
+            {"$match": {"org_id": org_id, "status": {"$in": list(COUNTED_STATUSES)}}},
+            {"$group": {"_id": {"year": {"$substrBytes": ["$start_date", 0, 4]}, "status": "$status"},
+                        "n": {"$sum": 1}}},
+        ]):
+            years[g["_id"]["year"]][g["_id"]["status"]] = g["n"]
+        async for g in db.leave_balances.aggregate([
+            {"$match": {"org_id": org_id}},
+            {"$group": {"_id": "$year", "used": {"$sum": "$used_days"}, "total": {"$sum": "$total_days"}}},
+        ]):
+            years[str(g["_id"])]["used_days"] = g["used"]
+            years[str(g["_id"])]["total_days"] = g["total"]
+
+        return dict(years)
+
+    async def verify(self, org_id: str) -> bool:
+        """Rebuild the org's counters; True if they had drifted. Only a
+        stored copy at the same rev as the rebuild is compared."""
+        stored = await self.collection.find_one({"org_id": org_id}, {"_id": 0})
+        rebuilt = await self.rebuild(org_id)
+        return (stored is not None and stored.get("complete", False)
+                and stored.get("rev") == rebuilt["rev"]
+                and _normalized(stored) != _normalized(rebuilt))
+
+    async def verify_all(self, concurrency: int = ORG_JOB_CONCURRENCY) -> int:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(org_id):
+            async with semaphore:
+                return await self.verify(org_id)
+
+        org_ids = await db.organizations.distinct("org_id")
+        drifted = sum(await asyncio.gather(*(run(org_id) for org_id in org_ids)))
+        if drifted:
+            logger.warning("org_stats: corrected drift in %d of %d organizations", drifted, len(org_ids))
+        return drifted
+
+
+def _normalized(doc: dict) -> dict:
+    return {
+        year: {k: round(v, 3) for k, v in counters.items() if v}
+        for year, counters in doc.get("years", {}).items()
+        if any(counters.values())
+    }
+
+
+org_stats = OrgStatsCounters(db.org_stats)
+
+
+async def _acquire_lease(name: str, seconds: float) -> bool:
+    """Only one worker per interval runs the verifier: a missing or expired
+    lease matches and is (re)written, a held one makes the upsert collide."""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.leases.update_one(
+            {"_id": name, "until": {"$lt": now}},
+            {"$set": {"until": now + timedelta(seconds=seconds)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def run_verifier(interval: Optional[float] = None):
+    """Background loop started by the app lifespan."""
+    interval = interval or ORG_STATS_VERIFY_INTERVAL_SECONDS
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await _acquire_lease(VERIFIER_LEASE, interval * 0.9):
+                await org_stats.verify_all()
+        except Exception:
+            logger.exception("org_stats verifier failed")
@@ -0,0 +1,125 @@
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cache import TTLCache
+from config import INTERVAL_CACHE_SIZE, INTERVAL_CACHE_TTL_SECONDS
+from database import db
+
+# Requests in these states block the same period for the same user
+ACTIVE_STATUSES = ["pending", "approved"]
+
+
+class IntervalSet:
+    """Closed [start, end] date intervals (YYYY-MM-DD strings) of one user.
+
+    Starts are kept sorted alongside a running maximum of the ends, so an
+    overlap query is a single bisect: among intervals starting on or before
+    `end`, the latest end tells whether any reaches `start`. This stays
+    correct even when stored intervals overlap each other (e.g. closure
+    auto-leave on top of a regular request)."""
+
+    def __init__(self, intervals: Iterable[Tuple[str, str]] = ()):
+        self._pairs: List[Tuple[str, str]] = sorted(intervals)
+        self.starts: List[str] = []
+        self.max_ends: List[str] = []
+        self._rebuild(0)
+
+    def _rebuild(self, start_index: int):
+        # Entries before start_index are unchanged, so their running max is reused
+        self.starts = [s for s, _ in self._pairs]
+        max_ends = self.max_ends[:start_index]
+        running = max_ends[-1] if max_ends else ""
+        for _, end in self._pairs[start_index:]:
+            running = max(running, end)
+            max_ends.append(running)
+        self.max_ends = max_ends
+
+    def overlaps(self, start: str, end: str) -> bool:
+        i = bisect_right(self.starts, end)
+        return i > 0 and self.max_ends[i - 1] >= start
+
+    def add(self, start: str, end: str):
+        index = bisect_left(self.starts, start)
+        insort(self._pairs, (start, end))
+        self._rebuild(index)
+
+    def __len__(self):
+        return len(self._pairs)
+
+
+class OverlapChecker:
+    """Conflict checks for leave requests.
+
+    `has_overlap` is the authoritative single-request check and is answered
+    by the (user_id, status, start_date, end_date) index. `check_many`
+    validates a whole batch in memory against per-user IntervalSets that are
+    loaded with one query and kept in a bounded TTL cache; write paths call
+    `invalidate` so the cache never outlives a change made by this worker."""
+
+    def __init__(self, collection, maxsize: int, ttl: float):
+        self.collection = collection
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, name="leave_intervals")
+
+    async def has_overlap(self, user_id: str, start: str, end: str) -> bool:
+        existing = await self.collection.find_one({
+            "user_id": user_id,
+            "status": {"$in": ACTIVE_STATUSES},
+            "start_date": {"$lte": end},
+            "end_date": {"$gte": start}
+        }, {"_id": 0, "id": 1})
+        return existing is not None
+
+    async def warm(self, user_ids: Iterable[str], refresh: bool = False) -> Dict[str, IntervalSet]:
+        result: Dict[str, IntervalSet] = {}
+        missing = []
+        for user_id in set(user_ids):
+            cached = None if refresh else self._cache.get(user_id)
+            if cached is None:
+                missing.append(user_id)
+            else:
+                result[user_id] = cached
+
+        if missing:
+            loaded: Dict[str, list] = {user_id: [] for user_id in missing}
+            cursor = self.collection.find(
+                {"user_id": {"$in": missing}, "status": {"$in": ACTIVE_STATUSES}},
+                {"_id": 0, "user_id": 1, "start_date": 1, "end_date": 1}
+            )
+            async for doc in cursor:
+                loaded[doc["user_id"]].append((doc["start_date"], doc["end_date"]))
+            for user_id, intervals in loaded.items():
+                result[user_id] = IntervalSet(intervals)
+                self._cache.set(user_id, result[user_id])
+
+        return result
+
+    async def check_many(
+        self, proposals: List[Tuple[str, str, str]], refresh: bool = False
+    ) -> List[bool]:
+        """For each (user_id, start, end) return True if it conflicts with an
+        active request or with an earlier proposal of the same batch."""
+        existing = await self.warm((p[0] for p in proposals), refresh=refresh)
+        accepted: Dict[str, IntervalSet] = {}
+        conflicts = []
+        for user_id, start, end in proposals:
+            batch = accepted.get(user_id)
+            conflict = existing[user_id].overlaps(start, end) or (
+                batch is not None and batch.overlaps(start, end)
+            )
+            if not conflict:
+                accepted.setdefault(user_id, IntervalSet()).add(start, end)
+            conflicts.append(conflict)
+        return conflicts
+
+    def invalidate(self, user_id: Optional[str] = None):
+        if user_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(user_id)
+
+
+overlap_checker = OverlapChecker(
+    db.leave_requests,
+    maxsize=INTERVAL_CACHE_SIZE,
+    ttl=INTERVAL_CACHE_TTL_SECONDS
+)
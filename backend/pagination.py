@@ -0,0 +1,112 @@
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and "$date" in value:
+        return datetime.fromisoformat(value["$date"])
+    return value
+
+
+class Keyset:
+    """Opaque cursor pagination over a unique, indexed sort key.
+
+    The cursor encodes the sort-key values of the last document of a page;
+    the next page is fetched with a range filter on those values instead of
+    `.skip()`, so deep pages cost the same as the first one. The sort key
+    must end with a unique field (id / user_id) to break ties."""
+
+    def __init__(self, fields: List[Tuple[str, int]]):
+        self.fields = fields
+
+    @property
+    def sort(self) -> List[Tuple[str, int]]:
+        return list(self.fields)
+
+    def encode(self, doc: dict) -> str:
+        values = [_encode_value(doc.get(name)) for name, _ in self.fields]
+        raw = json.dumps(values, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode(self, cursor: str) -> list:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            values = [_decode_value(v) for v in json.loads(raw)]
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Cursore non valido")
+        if len(values) != len(self.fields):
+            raise HTTPException(status_code=400, detail="Cursore non valido")
+        return values
+
+    def after(self, cursor: str) -> dict:
+        """Filter matching the documents that sort strictly after `cursor`."""
+        values = self.decode(cursor)
+        clauses = []
+        for i, (name, direction) in enumerate(self.fields):
+            clause = {n: v for (n, _), v in zip(self.fields[:i], values[:i])}
+            clause[name] = {"$gt" if direction > 0 else "$lt": values[i]}
+            clauses.append(clause)
+        return {"$or": clauses}
+
+    def next_cursor(self, docs: list, page_size: int) -> Optional[str]:
+        if not docs or len(docs) < page_size:
+            return None
+        return self.encode(docs[-1])
+
+
+async def fetch_page(
+    collection, query: dict, projection: dict, keyset: Keyset,
+    response: Response, page: int, page_size: int, cursor: Optional[str] = None
+) -> list:
+    """Run a paginated find and expose the next cursor in X-Next-Cursor.
+
+    With a cursor the page is located by keyset; without one the legacy
+    page/page_size (skip-based) behaviour is kept for existing callers."""
+    if cursor:
+        query = {"$and": [query, keyset.after(cursor)]}
+        find = collection.find(query, projection).sort(keyset.sort)
+    else:
+        skip = (max(1, page) - 1) * page_size
+        find = collection.find(query, projection).sort(keyset.sort).skip(skip)
+
+    docs = await find.to_list(page_size)
+    _set_next_cursor(response, keyset, docs, page_size)
+    return docs
+
+
+async def aggregate_page(
+    collection, query: dict, stages: list, keyset: Keyset,
+    response: Response, page: int, page_size: int, cursor: Optional[str] = None
+) -> list:
+    """Like fetch_page, but the page is selected first and then passed
+    through `stages` (lookups, projections) in the same aggregation."""
+    if cursor:
+        pipeline = [{"$match": {"$and": [query, keyset.after(cursor)]}}, {"$sort": dict(keyset.sort)}]
+    else:
+        skip = (max(1, page) - 1) * page_size
+        pipeline = [{"$match": query}, {"$sort": dict(keyset.sort)}]
+        if skip:
+            pipeline.append({"$skip": skip})
+    pipeline.append({"$limit": page_size})
+
+    docs = await collection.aggregate(pipeline + stages).to_list(page_size)
+    _set_next_cursor(response, keyset, docs, page_size)
+    return docs
+
+
+def _set_next_cursor(response: Response, keyset: Keyset, docs: list, page_size: int):
+    next_cursor = keyset.next_cursor(docs, page_size)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,35 @@
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
+from config import DB_NAME, RATELIMIT_STORAGE_TIMEOUT_MS, RATELIMIT_STORAGE_URI, RATELIMIT_STRATEGY
+
+
+def _storage_options(uri: str) -> dict:
+    # Keep Mongo-backed counters next to the application data; the limits
+    # library creates TTL indexes on `expireAt` for both collections.
+    # slowapi uses the synchronous pymongo storage, so every limited request
+    # blocks the event loop for one round trip; the timeouts cap that wait
+    # when MongoDB is slow or unreachable before the in-memory fallback.
+    if uri.startswith(("mongodb://", "mongodb+srv://")):
+        return {
+            "database_name": DB_NAME,
+            "counter_collection_name": "rate_limit_counters",
+            "window_collection_name": "rate_limit_windows",
+            "serverSelectionTimeoutMS": RATELIMIT_STORAGE_TIMEOUT_MS,
+            "connectTimeoutMS": RATELIMIT_STORAGE_TIMEOUT_MS,
+            "socketTimeoutMS": RATELIMIT_STORAGE_TIMEOUT_MS,
+        }
+    return {}
+
+
+# Counters live in a shared backend (MongoDB by default, or any limits
+# storage URI such as redis://) so every uvicorn worker enforces the same
+# budget. If the backend is unreachable the limiter degrades to per-worker
+# in-memory counters instead of failing the request.
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=RATELIMIT_STORAGE_URI,
+    storage_options=_storage_options(RATELIMIT_STORAGE_URI),
+    strategy=RATELIMIT_STRATEGY,
+    in_memory_fallback_enabled=True,
+)
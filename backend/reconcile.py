@@ -0,0 +1,180 @@
+"""
+Balance reconciliation job.
+
+Recomputes `leave_balances.used_days` from approved `leave_requests`
+entirely inside MongoDB: one aggregation per organization computes the
+expected usage per (user, leave type, year), compares it with the stored
+balances and writes the corrected values back with `$merge`.
+
+Run: python reconcile.py [--org ORG_ID] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from config import ORG_JOB_CONCURRENCY
+from database import db
+from org_stats import org_stats
+
+logger = logging.getLogger("powerleave")
+
+# Differences below this threshold are float noise from partial-day leave
+TOLERANCE = 0.001
+SAMPLE_SIZE = 20
+
+
+def _diff_stages(org_id: str) -> list:
+    """Stages yielding one document per (user, type, year) whose stored
+    used_days differs from the sum of its approved requests."""
+    return [
+        {"$match": {"org_id": org_id, "status": "approved"}},
+        {"$project": {
+            "_id": 0,
+            "user_id": 1,
+            "leave_type_id": 1,
+            "year": {"$toInt": {"$substrBytes": ["$start_date", 0, 4]}},
+            "used": {"$multiply": [
+                {"$ifNull": ["$days", 0]},
+                {"$divide": [{"$ifNull": ["$hours", 8]}, 8]}
+            ]},
+            "stored": {"$literal": 0},
+        }},
+        {"$unionWith": {"coll": "leave_balances", "pipeline": [
+            {"$match": {"org_id": org_id}},
+            {"$project": {
+                "_id": 0,
+                "user_id": 1,
+                "leave_type_id": 1,
+                "year": 1,
+                "used": {"$literal": 0},
+                "stored": {"$ifNull": ["$used_days", 0]},
+                "balance_id": "$_id",
+                "total_days": 1,
+            }},
+        ]}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "leave_type_id": "$leave_type_id", "year": "$year"},
+            "used": {"$sum": "$used"},
+            "stored": {"$sum": "$stored"},
+            "balance_id": {"$max": "$balance_id"},
+            "total_days": {"$max": "$total_days"},
+        }},
+        {"$match": {"$expr": {"$gt": [{"$abs": {"$subtract": ["$used", "$stored"]}}, TOLERANCE]}}},
+    ]
+
+
+def _merge_stages(org_id: str) -> list:
+    return [
+        {"$lookup": {
+            "from": "leave_types",
+            "localField": "_id.leave_type_id",
+            "foreignField": "id",
+            "as": "leave_type",
+        }},
+        {"$replaceWith": {"$mergeObjects": [
+            {
+                "user_id": "$_id.user_id",
+                "leave_type_id": "$_id.leave_type_id",
+                "year": "$_id.year",
+                "org_id": {"$literal": org_id},
+                "used_days": "$used",
+                "total_days": {"$ifNull": [
+                    "$total_days", {"$ifNull": [{"$first": "$leave_type.days_per_year"}, 0]}
+                ]},
+            },
+            # Existing balances keep their _id; missing ones get a new one
+            {"$cond": [{"$ifNull": ["$balance_id", False]}, {"_id": "$balance_id"}, {}]},
+        ]}},
+        {"$merge": {
+            "into": "leave_balances",
+            "on": "_id",
+            "whenMatched": "merge",
+            "whenNotMatched": "insert",
+        }},
+    ]
+
+
+async def backfill_balance_org_ids():
+    """Balances upserted by older review code lack org_id; attach it from
+    the owning user so the per-org pipelines can see them."""
+    await db.leave_balances.aggregate([
+        {"$match": {"org_id": {"$exists": False}}},
+        {"$lookup": {
+            "from": "users",
+            "localField": "user_id",
+            "foreignField": "user_id",
+            "as": "user",
+        }},
+        {"$project": {"org_id": {"$first": "$user.org_id"}}},
+        {"$match": {"org_id": {"$ne": None}}},
+        {"$merge": {"into": "leave_balances", "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}},
+    ]).to_list(None)
+
+
+async def reconcile_org(org_id: str, dry_run: bool = False) -> dict:
+    report = await db.leave_requests.aggregate(_diff_stages(org_id) + [
+        {"$facet": {
+            "count": [{"$count": "n"}],
+            "sample": [
+                {"$limit": SAMPLE_SIZE},
+                {"$project": {
+                    "_id": 0,
+                    "user_id": "$_id.user_id",
+                    "leave_type_id": "$_id.leave_type_id",
+                    "year": "$_id.year",
+                    "stored": 1,
+                    "expected": "$used",
+                }},
+            ],
+        }},
+    ]).to_list(1)
+    facet = report[0] if report else {"count": [], "sample": []}
+    diffs = facet["count"][0]["n"] if facet["count"] else 0
+
+    if diffs and not dry_run:
+        await db.leave_requests.aggregate(_diff_stages(org_id) + _merge_stages(org_id)).to_list(None)
+        await org_stats.rebuild(org_id)
+
+    return {"org_id": org_id, "diffs": diffs, "sample": facet["sample"]}
+
+
+async def reconcile_all(org_ids=None, dry_run: bool = False, concurrency: int = ORG_JOB_CONCURRENCY) -> list:
+    """Reconcile every organization (or the given ones), running at most
+    `concurrency` org pipelines at the same time."""
+    started = time.monotonic()
+    if not dry_run:
+        await backfill_balance_org_ids()
+    if org_ids is None:
+        org_ids = await db.organizations.distinct("org_id")
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(org_id):
+        async with semaphore:
+            return await reconcile_org(org_id, dry_run=dry_run)
+
+    reports = await asyncio.gather(*(run(org_id) for org_id in org_ids))
+    logger.info(
+        "Reconciled %d organizations in %.1fs, %d balances corrected",
+        len(reports), time.monotonic() - started, sum(r["diffs"] for r in reports)
+    )
+    return [r for r in reports if r["diffs"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute leave balances from approved requests")
+    parser.add_argument("--org", action="append", help="Only reconcile this org_id (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="Report differences without writing")
+    parser.add_argument("--concurrency", type=int, default=ORG_JOB_CONCURRENCY)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    reports = asyncio.run(reconcile_all(args.org, dry_run=args.dry_run, concurrency=args.concurrency))
+    print(json.dumps(reports, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
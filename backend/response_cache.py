@@ -0,0 +1,68 @@
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from cache import TTLCache
+from config import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_SECONDS
+from pagination import NEXT_CURSOR_HEADER
+from versions import org_versions
+
+# Headers set by handlers that are part of the cached response
+CACHED_HEADERS = [NEXT_CURSOR_HEADER]
+
+
+class ResponseCache:
+    """Serialized JSON responses of org-scoped reads, keyed by
+    (org, path, query params, org change version).
+
+    Every response carries an ETag (hash of the body) and
+    `Cache-Control: private, no-cache`, so browsers revalidate with
+    If-None-Match; a matching cached entry is answered with 304 without
+    running the handler. Write handlers bump the org's version through
+    `org_versions`, which makes the org's entries unreachable; the short TTL
+    bounds staleness for writes made on other workers."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, name="responses")
+        self._adapters = {}
+
+    def _adapter(self, model) -> TypeAdapter:
+        adapter = self._adapters.get(model)
+        if adapter is None:
+            adapter = self._adapters[model] = TypeAdapter(model)
+        return adapter
+
+    async def respond(
+        self, request: Request, org_id: str, model: Any,
+        build: Callable[[], Awaitable[Any]], response: Optional[Response] = None
+    ) -> Response:
+        """Serve `build()` validated against `model`, from cache when the
+        org has not changed. `response` is the handler's injected Response,
+        whose CACHED_HEADERS are stored with the body."""
+        key = (
+            org_id, request.url.path,
+            tuple(sorted(request.query_params.multi_items())),
+            org_versions.get(org_id),
+        )
+        entry = self._cache.get(key)
+        if entry is None:
+            adapter = self._adapter(model)
+            data = adapter.dump_python(adapter.validate_python(await build()), mode="json")
+            body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+            headers = {"ETag": f'"{hashlib.sha1(body).hexdigest()}"', "Cache-Control": "private, no-cache"}
+            if response is not None:
+                headers.update({h: response.headers[h] for h in CACHED_HEADERS if h in response.headers})
+            entry = (body, headers)
+            self._cache.set(key, entry)
+
+        body, headers = entry
+        if_none_match = request.headers.get("if-none-match", "")
+        if headers["ETag"] in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+response_cache = ResponseCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL_SECONDS)
@@ -0,0 +1,154 @@
+"""
+Annual balance rollover job.
+
+Creates next-year `leave_balances` for every user of every organization
+inside MongoDB: one aggregation per organization joins users with their
+leave types and previous-year balances, computes the carry-over of unused
+days and writes the result with `$merge` on the unique balance key
+(user_id, leave_type_id, year).
+
+Reruns are idempotent: an existing balance keeps its used_days and any
+manual adjustment of total_days, only its carried-over share is replaced.
+Finished organizations are recorded in `rollover_runs`, so an interrupted
+run resumes where it stopped.
+
+Run: python rollover.py [--year FROM_YEAR] [--org ORG_ID] [--force]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timezone
+
+from config import CARRY_OVER_LEAVE_TYPES, CARRY_OVER_MAX_DAYS, ORG_JOB_CONCURRENCY
+from database import db
+from org_stats import org_stats
+
+logger = logging.getLogger("powerleave")
+
+
+def _rollover_stages(org_id: str, from_year: int, carry_max: float) -> list:
+    """Pipeline over `users` producing and merging one balance per
+    (user, leave type) for `from_year + 1`."""
+    unused = {"$max": [0, {"$subtract": [
+        {"$ifNull": [{"$first": "$previous.total_days"}, 0]},
+        {"$ifNull": [{"$first": "$previous.used_days"}, 0]},
+    ]}]}
+    return [
+        {"$match": {"org_id": org_id}},
+        {"$project": {"_id": 0, "user_id": 1}},
+        {"$lookup": {
+            "from": "leave_types",
+            "pipeline": [
+                {"$match": {"$or": [{"org_id": None}, {"org_id": org_id}]}},
+                {"$project": {"_id": 0, "id": 1, "days_per_year": 1}},
+            ],
+            "as": "leave_type",
+        }},
+        {"$unwind": "$leave_type"},
+        {"$lookup": {
+            "from": "leave_balances",
+            "localField": "user_id",
+            "foreignField": "user_id",
+            "let": {"type_id": "$leave_type.id"},
+            "pipeline": [
+                {"$match": {"year": from_year, "$expr": {"$eq": ["$leave_type_id", "$$type_id"]}}},
+                {"$project": {"_id": 0, "total_days": 1, "used_days": 1}},
+            ],
+            "as": "previous",
+        }},
+        {"$project": {
+            "user_id": 1,
+            "leave_type_id": "$leave_type.id",
+            "year": {"$literal": from_year + 1},
+            "org_id": {"$literal": org_id},
+            "used_days": {"$literal": 0},
+            "base_days": {"$ifNull": ["$leave_type.days_per_year", 0]},
+            "carried_over": {"$cond": [
+                {"$in": ["$leave_type.id", CARRY_OVER_LEAVE_TYPES]},
+                # Whole days only: used_days is fractional after hourly leave
+                {"$floor": {"$min": [unused, carry_max]}},
+                0,
+            ]},
+        }},
+        {"$set": {"total_days": {"$add": ["$base_days", "$carried_over"]}}},
+        {"$unset": "base_days"},
+        {"$merge": {
+            "into": "leave_balances",
+            "on": ["user_id", "leave_type_id", "year"],
+            # Swap the previous carry-over for the new one, keeping used
+            # days and manual adjustments of total_days
+            "whenMatched": [{"$set": {
+                "org_id": "$$new.org_id",
+                "total_days": {"$add": [
+                    {"$subtract": [{"$ifNull": ["$total_days", 0]}, {"$ifNull": ["$carried_over", 0]}]},
+                    "$$new.carried_over",
+                ]},
+                "carried_over": "$$new.carried_over",
+            }}],
+            "whenNotMatched": "insert",
+        }},
+    ]
+
+
+async def rollover_org(org_id: str, from_year: int) -> dict:
+    settings = await db.org_settings.find_one({"org_id": org_id}, {"_id": 0, "carry_over_max_days": 1}) or {}
+    carry_max = settings.get("carry_over_max_days")
+    if carry_max is None:
+        carry_max = CARRY_OVER_MAX_DAYS
+
+    await db.users.aggregate(_rollover_stages(org_id, from_year, float(carry_max))).to_list(None)
+    balances = await db.leave_balances.count_documents({"org_id": org_id, "year": from_year + 1})
+    await org_stats.rebuild(org_id)
+
+    await db.rollover_runs.update_one(
+        {"org_id": org_id, "year": from_year + 1},
+        {"$set": {"balances": balances, "finished_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    return {"org_id": org_id, "year": from_year + 1, "balances": balances}
+
+
+async def rollover_all(from_year: int, org_ids=None, force: bool = False,
+                       concurrency: int = ORG_JOB_CONCURRENCY) -> list:
+    """Roll every organization (or the given ones) over from `from_year`
+    to the next year, skipping organizations already done unless `force`."""
+    started = time.monotonic()
+    if org_ids is None:
+        org_ids = await db.organizations.distinct("org_id")
+    if not force:
+        done = set(await db.rollover_runs.distinct("org_id", {"year": from_year + 1}))
+        org_ids = [o for o in org_ids if o not in done]
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(org_id):
+        async with semaphore:
+            return await rollover_org(org_id, from_year)
+
+    reports = await asyncio.gather(*(run(org_id) for org_id in org_ids))
+    logger.info(
+        "Rolled %d organizations over to %d in %.1fs",
+        len(reports), from_year + 1, time.monotonic() - started
+    )
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create next-year leave balances with carry-over")
+    parser.add_argument("--year", type=int, default=datetime.now().year,
+                        help="Year to roll over from (default: current year)")
+    parser.add_argument("--org", action="append", help="Only roll over this org_id (repeatable)")
+    parser.add_argument("--force", action="store_true", help="Also rerun organizations already rolled over")
+    parser.add_argument("--concurrency", type=int, default=ORG_JOB_CONCURRENCY)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    reports = asyncio.run(rollover_all(args.year, args.org, force=args.force, concurrency=args.concurrency))
+    print(json.dumps(reports, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+
+from auth import get_current_user
+from heatmap import absence_heatmap, GROUP_FIELDS
+from models import AbsenceHeatmapResponse
+
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+
+@router.get("/heatmap", response_model=AbsenceHeatmapResponse)
+async def get_absence_heatmap(
+    year: Optional[int] = Query(None, ge=1970, le=2100),
+    group_by: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """People absent per day of the year, per leave type (and group)."""
+    if group_by and group_by not in GROUP_FIELDS:
+        raise HTTPException(status_code=400, detail="Raggruppamento non valido")
+    year = year or datetime.now(timezone.utc).year
+    return await absence_heatmap.get(current_user["org_id"], year, group_by)
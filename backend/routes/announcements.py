@@ -2,30 +2,30 @@ import uuid
 from datetime import datetime, timezone
 from typing import Optional, List
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
 
 from database import db
 from auth import get_current_user, get_admin_user
 from models import Announcement, SuccessResponse
+from pagination import Keyset, fetch_page
 
 router = APIRouter(prefix="/api/announcements", tags=["announcements"])
 
+ANNOUNCEMENTS_KEYSET = Keyset([("created_at", -1), ("id", -1)])
+
 
 @router.get("", response_model=List[Announcement])
 async def get_announcements(
+    response: Response,
     page: int = 1,
     page_size: int = 20,
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    org_id = current_user["org_id"]
-    skip = (max(1, page) - 1) * page_size
-
-    announcements = await db.announcements.find(
-        {"org_id": org_id},
-        {"_id": 0}
-    ).sort("created_at", -1).skip(skip).to_list(page_size)
-
-    return announcements
+    return await fetch_page(
+        db.announcements, {"org_id": current_user["org_id"]}, {"_id": 0},
+        ANNOUNCEMENTS_KEYSET, response, page, page_size, cursor
+    )
 
 
 @router.post("", response_model=Announcement)
@@ -3,19 +3,20 @@ import httpx
 from datetime import datetime, timedelta, timezone
 
 from fastapi import APIRouter, HTTPException, Depends, Response, Request
-from slowapi import Limiter
-from slowapi.util import get_remote_address
 
-from database import db, init_leave_balances
+from balances import init_leave_balances
+from database import db
 from auth import (
     create_access_token, verify_password, get_password_hash,
-    validate_password, get_current_user
+    validate_password, get_current_user, invalidate_user
 )
+from ratelimit import limiter
+from tokens import session_store
+from versions import org_versions
 from models import UserCreate, UserLogin, AuthResponse, LogoutResponse
 from config import SECRET_KEY
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
-limiter = Limiter(key_func=get_remote_address)
 
 
 @router.post("/register", response_model=AuthResponse)
@@ -42,7 +43,7 @@ async def register(request: Request, user_data: UserCreate, response: Response):
         "user_id": user_id,
         "email": user_data.email,
         "name": user_data.name,
-        "password_hash": get_password_hash(user_data.password),
+        "password_hash": await get_password_hash(user_data.password),
         "role": "admin",
         "org_id": org_id,
         "picture": None,
@@ -72,7 +73,7 @@ async def register(request: Request, user_data: UserCreate, response: Response):
 @limiter.limit("10/minute")
 async def login(request: Request, credentials: UserLogin, response: Response):
     user = await db.users.find_one({"email": credentials.email})
-    if not user or not verify_password(credentials.password, user["password_hash"]):
+    if not user or not await verify_password(credentials.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Credenziali non valide")
 
     token = create_access_token({"sub": user["user_id"]})
@@ -106,18 +107,12 @@ async def create_session(request: Request, response: Response):
     if not session_id:
         raise HTTPException(status_code=400, detail="session_id richiesto")
 
-    auth_base = "https://auth.emergentapi.com"
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(
-                f"{auth_base}/api/auth/session/{session_id}",
-                timeout=10
-            )
-            if resp.status_code != 200:
-                raise HTTPException(status_code=401, detail="Sessione non valida")
-            session_data = resp.json()
+        session_data = await request.app.state.auth_client.get_session(session_id)
     except httpx.RequestError:
         raise HTTPException(status_code=502, detail="Errore comunicazione auth service")
+    if session_data is None:
+        raise HTTPException(status_code=401, detail="Sessione non valida")
 
     user_info = session_data.get("user", {})
     email = user_info.get("email")
@@ -136,6 +131,8 @@ async def create_session(request: Request, response: Response):
         role = existing_user["role"]
         if picture:
             await db.users.update_one({"user_id": user_id}, {"$set": {"picture": picture}})
+            invalidate_user(user_id)
+            org_versions.bump(org_id)
     else:
         user_id = "user_" + uuid.uuid4().hex[:8]
         org_id = "org_" + uuid.uuid4().hex[:8]
@@ -159,13 +156,7 @@ async def create_session(request: Request, response: Response):
         })
         await init_leave_balances(user_id, org_id, now.year)
 
-    session_token = uuid.uuid4().hex
-    await db.user_sessions.insert_one({
-        "session_id": session_token,
-        "user_id": user_id,
-        "created_at": now,
-        "expires_at": now + timedelta(days=7)
-    })
+    session_token = await session_store.create(user_id, timedelta(days=7))
 
     response.set_cookie(
         key="session_token", value=session_token,
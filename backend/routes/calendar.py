@@ -1,10 +1,11 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional
 
 from fastapi import APIRouter, Depends
 
 from database import db
 from auth import get_current_user
+from holidays import holiday_calendar
 
 router = APIRouter(prefix="/api/calendar", tags=["calendar"])
 
@@ -45,10 +46,6 @@ async def get_calendar_closures(
     else:
         end_date = f"{year}-{month + 1:02d}-01"
 
-    closures = await db.company_closures.find({
-        "$or": [{"org_id": None}, {"org_id": org_id}],
-        "start_date": {"$lt": end_date},
-        "end_date": {"$gte": start_date}
-    }, {"_id": 0}).to_list(100)
-
-    return closures
+    # end_date is exclusive here, the calendar service takes inclusive bounds
+    last_day = (datetime.strptime(end_date, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+    return await holiday_calendar.closures(org_id, start_date, last_day)
@@ -2,31 +2,44 @@ import uuid
 from datetime import datetime, timedelta, timezone
 from typing import Optional, List
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 
 from database import db
+from dates import normalize_date
 from auth import get_current_user, get_admin_user
-from models import CompanyClosure, ClosureException, SuccessResponse
+from balances import release_requests
+from cascade import cascade_delete
+from closure_leave import generate_closure_leave
+from jobs import job_runner
+from overlap import overlap_checker
+from pagination import Keyset, fetch_page
+from response_cache import response_cache
+from holidays import holiday_calendar
+from versions import org_versions
+from models import CompanyClosure, ClosureException, SuccessResponse, JobStartedResponse
 
 router = APIRouter(prefix="/api/closures", tags=["closures"])
 
+EXCEPTIONS_KEYSET = Keyset([("created_at", -1), ("id", -1)])
+
 
 @router.get("", response_model=List[CompanyClosure])
 async def get_closures(
+    request: Request,
     year: Optional[int] = None,
     current_user: dict = Depends(get_current_user)
 ):
+    """National holidays and closures of a year; without `year`, every
+    stored closure plus the current year's national holidays."""
     org_id = current_user["org_id"]
-    query = {"$or": [{"org_id": None}, {"org_id": org_id}]}
-
-    if year:
-        query["start_date"] = {"$gte": f"{year}-01-01", "$lte": f"{year}-12-31"}
 
-    closures = await db.company_closures.find(
-        query, {"_id": 0}
-    ).sort("start_date", 1).to_list(500)
+    async def load():
+        if not year:
+            return await holiday_calendar.all_closures(org_id, datetime.now(timezone.utc).year)
+        calendar = await holiday_calendar.year(org_id, year)
+        return [c for c in calendar.closures if c["start_date"] >= f"{year}-01-01"]
 
-    return closures
+    return await response_cache.respond(request, org_id, List[CompanyClosure], load)
 
 
 @router.post("", response_model=CompanyClosure)
@@ -37,6 +50,12 @@ async def create_closure(data: dict, current_user: dict = Depends(get_admin_user
 
     if not start_date:
         raise HTTPException(status_code=400, detail="Data di inizio richiesta")
+    # Store the zero-padded form: the holiday calendar and range queries rely on it
+    start_date, end_date = normalize_date(start_date), normalize_date(end_date)
+    if start_date is None or end_date is None:
+        raise HTTPException(status_code=400, detail="Formato data non valido. Usa YYYY-MM-DD")
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="La data di fine deve essere uguale o successiva alla data di inizio")
 
     closure_id = str(uuid.uuid4())
     closure = {
@@ -52,57 +71,43 @@ async def create_closure(data: dict, current_user: dict = Depends(get_admin_user
         "created_by": current_user["user_id"]
     }
     await db.company_closures.insert_one(closure)
+    closure.pop("_id", None)
+    holiday_calendar.invalidate(org_id)
+    org_versions.bump(org_id)
 
-    # Auto-create leave requests if enabled
+    # Auto-create leave requests in the background; progress at /api/jobs/{job_id}
     if data.get("auto_leave"):
-        users = await db.users.find(
-            {"org_id": org_id},
-            {"_id": 0, "user_id": 1, "name": 1}
-        ).to_list(500)
-
-        start = datetime.strptime(start_date, "%Y-%m-%d")
-        end = datetime.strptime(end_date, "%Y-%m-%d")
-        days = (end - start).days + 1
-
-        for u in users:
-            await db.leave_requests.insert_one({
-                "id": str(uuid.uuid4()),
-                "user_id": u["user_id"],
-                "user_name": u["name"],
-                "org_id": org_id,
-                "leave_type_id": "ferie",
-                "leave_type_name": "Ferie",
-                "start_date": start_date,
-                "end_date": end_date,
-                "days": days,
-                "hours": 8,
-                "notes": f"Chiusura aziendale: {closure['reason']}",
-                "status": "approved",
-                "closure_id": closure_id,
-                "is_closure_leave": True,
-                "reviewed_by": current_user["user_id"],
-                "reviewed_at": datetime.now(timezone.utc),
-                "created_at": datetime.now(timezone.utc),
-            })
+        job_closure = dict(closure)
+        closure["job_id"] = await job_runner.start(
+            "closure_leave", org_id, current_user["user_id"],
+            lambda job: generate_closure_leave(job, job_closure, current_user["user_id"])
+        )
 
-    closure.pop("_id", None)
     return closure
 
 
-@router.delete("/{closure_id}", response_model=SuccessResponse)
+@router.delete("/{closure_id}", response_model=JobStartedResponse)
 async def delete_closure(closure_id: str, current_user: dict = Depends(get_admin_user)):
-    closure = await db.company_closures.find_one(
-        {"id": closure_id, "org_id": current_user["org_id"]},
-        {"_id": 0}
-    )
-    if not closure:
+    """Delete the closure now; its auto-leave requests and exceptions are
+    removed by a background job (progress at /api/jobs/{job_id})."""
+    org_id = current_user["org_id"]
+    result = await db.company_closures.delete_one({"id": closure_id, "org_id": org_id})
+    if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Chiusura non trovata")
+    holiday_calendar.invalidate(org_id)
+    org_versions.bump(org_id)
 
-    await db.company_closures.delete_one({"id": closure_id})
-    await db.leave_requests.delete_many({"closure_id": closure_id})
-    await db.closure_exceptions.delete_many({"closure_id": closure_id})
+    async def work(job):
+        deleted = await cascade_delete(job, [
+            (db.leave_requests, {"closure_id": closure_id}, lambda docs: release_requests(org_id, docs)),
+            (db.closure_exceptions, {"closure_id": closure_id}, None),
+        ])
+        overlap_checker.invalidate()
+        org_versions.bump(org_id)
+        return deleted
 
-    return SuccessResponse()
+    job_id = await job_runner.start("closure_delete", org_id, current_user["user_id"], work)
+    return JobStartedResponse(job_id=job_id)
 
 
 @router.post("/{closure_id}/exception", response_model=ClosureException)
@@ -133,20 +138,21 @@ async def request_exception(closure_id: str, exception_data: dict, current_user:
 
 
 @router.get("/exceptions", response_model=List[ClosureException])
-async def get_exceptions(current_user: dict = Depends(get_current_user)):
-    org_id = current_user["org_id"]
-
-    if current_user.get("role") == "admin":
-        exceptions = await db.closure_exceptions.find(
-            {"org_id": org_id}, {"_id": 0}
-        ).sort("created_at", -1).to_list(200)
-    else:
-        exceptions = await db.closure_exceptions.find(
-            {"org_id": org_id, "user_id": current_user["user_id"]},
-            {"_id": 0}
-        ).sort("created_at", -1).to_list(200)
+async def get_exceptions(
+    response: Response,
+    page: int = 1,
+    page_size: int = 200,
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    query = {"org_id": current_user["org_id"]}
+    if current_user.get("role") != "admin":
+        query["user_id"] = current_user["user_id"]
 
-    return exceptions
+    return await fetch_page(
+        db.closure_exceptions, query, {"_id": 0}, EXCEPTIONS_KEYSET,
+        response, page, page_size, cursor
+    )
 
 
 @router.put("/exceptions/{exception_id}/review", response_model=SuccessResponse)
@@ -155,25 +161,32 @@ async def review_exception(exception_id: str, review_data: dict, current_user: d
     if status not in ["approved", "rejected"]:
         raise HTTPException(status_code=400, detail="Stato non valido")
 
-    exception = await db.closure_exceptions.find_one({"id": exception_id}, {"_id": 0})
-    if not exception:
-        raise HTTPException(status_code=404, detail="Eccezione non trovata")
-
-    await db.closure_exceptions.update_one(
-        {"id": exception_id},
+    org_id = current_user["org_id"]
+    exception = await db.closure_exceptions.find_one_and_update(
+        {"id": exception_id, "org_id": org_id, "status": "pending"},
         {"$set": {
             "status": status,
             "reviewed_by": current_user["user_id"],
             "reviewed_at": datetime.now(timezone.utc)
-        }}
+        }},
+        projection={"_id": 0, "closure_id": 1, "user_id": 1}
     )
+    if not exception:
+        if await db.closure_exceptions.count_documents({"id": exception_id, "org_id": org_id}, limit=1):
+            raise HTTPException(status_code=409, detail="Eccezione già revisionata")
+        raise HTTPException(status_code=404, detail="Eccezione non trovata")
 
     # If approved, remove auto-created leave request
     if status == "approved":
-        await db.leave_requests.delete_one({
+        removed = await db.leave_requests.find_one_and_delete({
             "closure_id": exception["closure_id"],
             "user_id": exception["user_id"],
             "is_closure_leave": True
-        })
+        }, projection={"_id": 0, "id": 1, "user_id": 1, "leave_type_id": 1, "status": 1,
+                       "start_date": 1, "days": 1, "hours": 1})
+        overlap_checker.invalidate(exception["user_id"])
+        if removed:
+            await release_requests(org_id, [removed])
+            org_versions.bump(org_id)
 
     return SuccessResponse()
@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
+
+from database import db
+from auth import get_admin_user
+from config import EXPORT_BATCH_SIZE
+
+router = APIRouter(prefix="/api/export", tags=["export"])
+
+# Rows are buffered and flushed in chunks of this size
+FLUSH_ROWS = 500
+
+LEAVE_REQUEST_COLUMNS = [
+    "id", "user_id", "user_name", "leave_type_id", "leave_type_name",
+    "start_date", "end_date", "days", "hours", "status", "notes",
+    "reviewed_by", "reviewed_at", "created_at",
+]
+BALANCE_COLUMNS = [
+    "user_id", "leave_type_id", "year", "total_days", "used_days", "remaining_days",
+]
+EXCEPTION_COLUMNS = [
+    "id", "closure_id", "user_id", "user_name", "reason", "status",
+    "reviewed_by", "reviewed_at", "created_at",
+]
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def _rows(cursor, columns, fmt, transform=None):
+    """Serialize a Motor cursor row by row so memory stays constant."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer:
+        writer.writerow(columns)
+
+    count = 0
+    async for doc in cursor:
+        if transform:
+            transform(doc)
+        values = [_plain(doc.get(c)) for c in columns]
+        if writer:
+            writer.writerow(["" if v is None else v for v in values])
+        else:
+            buffer.write(json.dumps(dict(zip(columns, values)), ensure_ascii=False) + "\n")
+        count += 1
+        if count % FLUSH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _stream(cursor, columns, fmt, filename, transform=None):
+    if fmt not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Formato non supportato. Usa csv o ndjson")
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _rows(cursor.batch_size(EXPORT_BATCH_SIZE), columns, fmt, transform),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
+
+
+def _created_between(query: dict, start_date: Optional[str], end_date: Optional[str]):
+    try:
+        bounds = {}
+        if start_date:
+            bounds["$gte"] = datetime.strptime(start_date, "%Y-%m-%d")
+        if end_date:
+            bounds["$lt"] = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Formato data non valido. Usa YYYY-MM-DD")
+    if bounds:
+        query["created_at"] = bounds
+
+
+@router.get("/leave-requests")
+async def export_leave_requests(
+    file_format: str = Query("ndjson", alias="format"),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    status: Optional[str] = None,
+    current_user: dict = Depends(get_admin_user)
+):
+    """Requests overlapping [start_date, end_date], optionally by status."""
+    query = {"org_id": current_user["org_id"]}
+    if start_date:
+        query["end_date"] = {"$gte": start_date}
+    if end_date:
+        query["start_date"] = {"$lte": end_date}
+    if status:
+        query["status"] = status
+
+    cursor = db.leave_requests.find(query, {"_id": 0}).sort("start_date", 1)
+    return _stream(cursor, LEAVE_REQUEST_COLUMNS, file_format, "leave-requests")
+
+
+@router.get("/leave-balances")
+async def export_leave_balances(
+    file_format: str = Query("ndjson", alias="format"),
+    year: Optional[int] = None,
+    current_user: dict = Depends(get_admin_user)
+):
+    query = {"org_id": current_user["org_id"]}
+    if year:
+        query["year"] = year
+
+    def add_remaining(doc):
+        doc["remaining_days"] = doc.get("total_days", 0) - doc.get("used_days", 0)
+
+    cursor = db.leave_balances.find(query, {"_id": 0}).sort([("year", 1), ("user_id", 1)])
+    return _stream(cursor, BALANCE_COLUMNS, file_format, "leave-balances", add_remaining)
+
+
+@router.get("/closure-exceptions")
+async def export_closure_exceptions(
+    file_format: str = Query("ndjson", alias="format"),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    status: Optional[str] = None,
+    current_user: dict = Depends(get_admin_user)
+):
+    """Exceptions requested between start_date and end_date, optionally by status."""
+    query = {"org_id": current_user["org_id"]}
+    _created_between(query, start_date, end_date)
+    if status:
+        query["status"] = status
+
+    cursor = db.closure_exceptions.find(query, {"_id": 0}).sort("created_at", 1)
+    return _stream(cursor, EXCEPTION_COLUMNS, file_format, "closure-exceptions")
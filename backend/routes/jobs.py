@@ -0,0 +1,15 @@
+from fastapi import APIRouter, HTTPException, Depends
+
+from auth import get_admin_user
+from jobs import job_runner
+from models import JobStatus
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+
+@router.get("/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str, current_user: dict = Depends(get_admin_user)):
+    job = await job_runner.get(job_id, current_user["org_id"])
+    if not job:
+        raise HTTPException(status_code=404, detail="Operazione non trovata")
+    return job
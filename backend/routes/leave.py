@@ -1,27 +1,71 @@
+import csv
 import uuid
+from collections import defaultdict
 from datetime import datetime, timezone
 from typing import Optional, List
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 
+from balances import apply_balance_deltas, deduct_request_days, request_balance_key, request_used_days
 from database import db
 from auth import get_current_user, get_admin_user
+from config import IMPORT_MAX_ROWS
+from leave_import import parse_rows, import_leave_requests
+from metadata import tenant_metadata
+from org_stats import org_stats
+from overlap import overlap_checker
+from pagination import Keyset, fetch_page, aggregate_page
+from reconcile import reconcile_org
+from response_cache import response_cache
+from versions import org_versions
+from workdays import working_days, recompute_request_days
 from models import (
     LeaveRequestCreate, LeaveType, LeaveRequest, LeaveBalanceResponse,
-    SuccessResponse, LeaveRequestCreatedResponse
+    SuccessResponse, LeaveRequestCreatedResponse, LeaveImportResponse,
+    BulkReviewResponse, RecomputeDaysResponse
 )
 
 router = APIRouter(prefix="/api", tags=["leave"])
 
+BULK_REVIEW_MAX_IDS = 1000
+
+REQUESTS_KEYSET = Keyset([("created_at", -1), ("id", -1)])
+BALANCES_KEYSET = Keyset([("user_id", 1), ("leave_type_id", 1)])
+
+# Joins user and leave type names and projects LeaveBalanceResponse
+BALANCE_RESPONSE_STAGES = [
+    {"$lookup": {
+        "from": "users", "localField": "user_id", "foreignField": "user_id",
+        "pipeline": [{"$project": {"_id": 0, "name": 1}}], "as": "user"
+    }},
+    {"$lookup": {
+        "from": "leave_types", "localField": "leave_type_id", "foreignField": "id",
+        "pipeline": [{"$project": {"_id": 0, "name": 1, "color": 1}}], "as": "leave_type"
+    }},
+    {"$project": {
+        "_id": 0,
+        "user_id": 1,
+        "org_id": 1,
+        "leave_type_id": 1,
+        "year": 1,
+        "total_days": 1,
+        "used_days": 1,
+        "user_name": {"$ifNull": [{"$first": "$user.name"}, ""]},
+        "leave_type_name": {"$ifNull": [{"$first": "$leave_type.name"}, ""]},
+        "leave_type_color": {"$ifNull": [{"$first": "$leave_type.color"}, "#666"]},
+        "remaining_days": {"$subtract": [
+            {"$ifNull": ["$total_days", 0]}, {"$ifNull": ["$used_days", 0]}
+        ]},
+    }},
+]
+
 
 @router.get("/leave-types", response_model=List[LeaveType])
-async def get_leave_types(current_user: dict = Depends(get_current_user)):
+async def get_leave_types(request: Request, current_user: dict = Depends(get_current_user)):
     org_id = current_user["org_id"]
-    types = await db.leave_types.find(
-        {"$or": [{"org_id": None}, {"org_id": org_id}]},
-        {"_id": 0}
-    ).to_list(100)
-    return types
+    return await response_cache.respond(
+        request, org_id, List[LeaveType], lambda: tenant_metadata.leave_types(org_id)
+    )
 
 
 @router.post("/leave-types", response_model=LeaveType)
@@ -36,6 +80,8 @@ async def create_leave_type(data: dict, current_user: dict = Depends(get_admin_u
         "is_custom": True
     }
     await db.leave_types.insert_one(leave_type)
+    tenant_metadata.invalidate(org_id)
+    org_versions.bump(org_id)
     leave_type.pop("_id", None)
     return leave_type
 
@@ -51,6 +97,9 @@ async def update_leave_type(type_id: str, data: dict, current_user: dict = Depen
         updates["days_per_year"] = data["days_per_year"]
     if updates:
         await db.leave_types.update_one({"id": type_id}, {"$set": updates})
+        # The type may be global or belong to any org
+        tenant_metadata.invalidate(None)
+        org_versions.bump(None)
     return SuccessResponse()
 
 
@@ -59,15 +108,19 @@ async def delete_leave_type(type_id: str, current_user: dict = Depends(get_admin
     result = await db.leave_types.delete_one({"id": type_id, "is_custom": True})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Tipo di assenza non trovato o non eliminabile")
+    tenant_metadata.invalidate(None)
+    org_versions.bump(None)
     return SuccessResponse()
 
 
 @router.get("/leave-requests", response_model=List[LeaveRequest])
 async def get_leave_requests(
+    response: Response,
     filter_status: Optional[str] = None,
     user_id: Optional[str] = None,
     page: int = 1,
     page_size: int = 50,
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     org_id = current_user["org_id"]
@@ -81,9 +134,10 @@ async def get_leave_requests(
     if filter_status:
         query["status"] = filter_status
 
-    skip = (max(1, page) - 1) * page_size
-    requests = await db.leave_requests.find(query, {"_id": 0}).sort("created_at", -1).skip(skip).to_list(page_size)
-    return requests
+    return await fetch_page(
+        db.leave_requests, query, {"_id": 0}, REQUESTS_KEYSET,
+        response, page, page_size, cursor
+    )
 
 
 @router.post("/leave-requests", response_model=LeaveRequestCreatedResponse)
@@ -113,23 +167,19 @@ async def create_leave_request(data: LeaveRequestCreate, current_user: dict = De
     if start > max_future_date or end > max_future_date:
         raise HTTPException(status_code=422, detail="Le date non possono essere oltre 2 anni nel futuro")
 
-    leave_type = await db.leave_types.find_one(
-        {"id": data.leave_type_id, "$or": [{"org_id": None}, {"org_id": org_id}]},
-        {"_id": 0}
-    )
+    # Store the zero-padded form: range queries compare dates as strings
+    start_date, end_date = start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+
+    leave_type = await tenant_metadata.leave_type(org_id, data.leave_type_id)
     if not leave_type:
         raise HTTPException(status_code=404, detail="Tipo di assenza non trovato")
 
-    existing = await db.leave_requests.find_one({
-        "user_id": user_id,
-        "status": {"$in": ["pending", "approved"]},
-        "start_date": {"$lte": data.end_date},
-        "end_date": {"$gte": data.start_date}
-    })
-    if existing:
+    if await overlap_checker.has_overlap(user_id, start_date, end_date):
         raise HTTPException(status_code=400, detail="Hai già una richiesta per questo periodo")
 
-    days = (end - start).days + 1
+    days = await working_days.count(org_id, start_date, end_date)
+    if days == 0:
+        raise HTTPException(status_code=422, detail="Il periodo selezionato non contiene giorni lavorativi")
 
     request_id = str(uuid.uuid4())
     leave_request = {
@@ -139,8 +189,8 @@ async def create_leave_request(data: LeaveRequestCreate, current_user: dict = De
         "org_id": org_id,
         "leave_type_id": data.leave_type_id,
         "leave_type_name": leave_type["name"],
-        "start_date": data.start_date,
-        "end_date": data.end_date,
+        "start_date": start_date,
+        "end_date": end_date,
         "days": days,
         "hours": data.hours,
         "notes": data.notes or "",
@@ -148,83 +198,182 @@ async def create_leave_request(data: LeaveRequestCreate, current_user: dict = De
         "created_at": datetime.now(timezone.utc),
     }
     await db.leave_requests.insert_one(leave_request)
+    overlap_checker.invalidate(user_id)
+    await org_stats.requests_added(org_id, [leave_request])
+    org_versions.bump(org_id)
 
     return LeaveRequestCreatedResponse(success=True, request_id=request_id)
 
 
+@router.post("/leave-requests/import", response_model=LeaveImportResponse)
+async def import_leave_requests_endpoint(
+    request: Request,
+    file_format: Optional[str] = Query(None, alias="format"),
+    current_user: dict = Depends(get_admin_user)
+):
+    """Bulk import of historical leave requests from CSV or JSON lines.
+    Columns/keys: user_id or email, leave_type_id, start_date, end_date,
+    hours, notes, status (default "approved")."""
+    if not file_format:
+        content_type = request.headers.get("content-type", "")
+        file_format = "csv" if "csv" in content_type else "ndjson"
+    if file_format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Formato non supportato. Usa csv o ndjson")
+
+    try:
+        rows = parse_rows(await request.body(), file_format)
+    except (UnicodeDecodeError, csv.Error):
+        raise HTTPException(status_code=400, detail="File non valido")
+    if not rows:
+        raise HTTPException(status_code=400, detail="Nessuna riga da importare")
+    if len(rows) > IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Massimo {IMPORT_MAX_ROWS} righe per importazione")
+
+    result = await import_leave_requests(current_user["org_id"], current_user, rows)
+    return LeaveImportResponse(**result)
+
+
 @router.put("/leave-requests/{request_id}/review", response_model=SuccessResponse)
 async def review_leave_request(request_id: str, data: dict, current_user: dict = Depends(get_admin_user)):
+    """Move a pending request to approved/rejected.
+
+    The status change is a single find_one_and_update guarded by
+    status "pending", so of two concurrent reviews only one wins; the
+    balance deduction goes through the request-id ledger and is applied
+    at most once."""
     status = data.get("status")
     if status not in ["approved", "rejected"]:
         raise HTTPException(status_code=400, detail="Stato non valido")
 
-    leave_request = await db.leave_requests.find_one({"id": request_id}, {"_id": 0})
-    if not leave_request:
-        raise HTTPException(status_code=404, detail="Richiesta non trovata")
-
-    await db.leave_requests.update_one(
-        {"id": request_id},
+    org_id = current_user["org_id"]
+    leave_request = await db.leave_requests.find_one_and_update(
+        {"id": request_id, "org_id": org_id, "status": "pending"},
         {"$set": {
             "status": status,
             "reviewed_by": current_user["user_id"],
             "reviewed_at": datetime.now(timezone.utc)
-        }}
+        }},
+        projection={"_id": 0, "id": 1, "user_id": 1, "leave_type_id": 1,
+                    "start_date": 1, "days": 1, "hours": 1}
     )
+    if not leave_request:
+        if await db.leave_requests.count_documents({"id": request_id, "org_id": org_id}, limit=1):
+            raise HTTPException(status_code=409, detail="Richiesta già revisionata")
+        raise HTTPException(status_code=404, detail="Richiesta non trovata")
+    overlap_checker.invalidate(leave_request["user_id"])
+    org_versions.bump(org_id)
 
+    # The counter changes ride along with the deduction's single $inc
+    changes = org_stats.reviewed_changes([leave_request], status)
     if status == "approved":
-        days_to_deduct = leave_request["days"] * (leave_request.get("hours", 8) / 8)
-        await db.leave_balances.update_one(
-            {
-                "user_id": leave_request["user_id"],
-                "leave_type_id": leave_request["leave_type_id"],
-                "year": datetime.now(timezone.utc).year
-            },
-            {"$inc": {"used_days": days_to_deduct}},
-            upsert=True
+        leave_type = await tenant_metadata.leave_type(org_id, leave_request["leave_type_id"])
+        await deduct_request_days(
+            org_id, leave_request, leave_type["days_per_year"] if leave_type else 0, stats_changes=changes
         )
+    else:
+        await org_stats.inc(org_id, changes)
 
     return SuccessResponse()
 
 
+@router.post("/leave-requests/bulk-review", response_model=BulkReviewResponse)
+async def bulk_review_leave_requests(data: dict, current_user: dict = Depends(get_admin_user)):
+    """Approve or reject many pending requests at once.
+    Body: {"ids": [...], "status": "approved" | "rejected"}"""
+    status = data.get("status")
+    if status not in ["approved", "rejected"]:
+        raise HTTPException(status_code=400, detail="Stato non valido")
+    ids = list(dict.fromkeys(data.get("ids") or []))
+    if not ids:
+        raise HTTPException(status_code=400, detail="Nessuna richiesta selezionata")
+    if len(ids) > BULK_REVIEW_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Massimo {BULK_REVIEW_MAX_IDS} richieste per operazione")
+
+    org_id = current_user["org_id"]
+    found = {r["id"]: r async for r in db.leave_requests.find(
+        {"id": {"$in": ids}, "org_id": org_id},
+        {"_id": 0, "id": 1, "user_id": 1, "leave_type_id": 1,
+         "start_date": 1, "days": 1, "hours": 1, "status": 1}
+    )}
+    pending_ids = [i for i in ids if i in found and found[i]["status"] == "pending"]
+
+    applied = set()
+    if pending_ids:
+        reviewed_at = datetime.now(timezone.utc)
+        result = await db.leave_requests.update_many(
+            {"id": {"$in": pending_ids}, "org_id": org_id, "status": "pending"},
+            {"$set": {
+                "status": status,
+                "reviewed_by": current_user["user_id"],
+                "reviewed_at": reviewed_at
+            }}
+        )
+        if result.modified_count == len(pending_ids):
+            applied = set(pending_ids)
+        else:
+            # Another admin reviewed some of them in the meantime
+            applied = {r["id"] async for r in db.leave_requests.find(
+                {"id": {"$in": pending_ids}, "reviewed_by": current_user["user_id"],
+                 "reviewed_at": reviewed_at},
+                {"_id": 0, "id": 1}
+            )}
+
+    await org_stats.request_reviewed(org_id, [found[i] for i in applied], status)
+    org_versions.bump(org_id)
+
+    if status == "approved" and applied:
+        deltas, ledger = defaultdict(float), defaultdict(list)
+        for request_id in applied:
+            key = request_balance_key(found[request_id])
+            deltas[key] += request_used_days(found[request_id])
+            ledger[key].append(request_id)
+        totals = {t["id"]: t["days_per_year"] for t in await tenant_metadata.leave_types(org_id)}
+        await apply_balance_deltas(org_id, deltas, totals, ledger)
+
+    for request_id in applied:
+        overlap_checker.invalidate(found[request_id]["user_id"])
+
+    results = []
+    for request_id in ids:
+        if request_id not in found:
+            outcome = "not_found"
+        elif request_id in applied:
+            outcome = "updated"
+        else:
+            outcome = "already_reviewed"
+        results.append({"id": request_id, "result": outcome})
+
+    return BulkReviewResponse(updated=len(applied), results=results)
+
+
+@router.post("/leave-requests/recompute-days", response_model=RecomputeDaysResponse)
+async def recompute_leave_days(current_user: dict = Depends(get_admin_user)):
+    """Recount the working days of all the organization's requests, then
+    reconcile balances so approved requests' new counts are reflected."""
+    org_id = current_user["org_id"]
+    result = await recompute_request_days(org_id)
+    if result["updated"]:
+        result["reconciled"] = (await reconcile_org(org_id))["diffs"]
+        org_versions.bump(org_id)
+    return RecomputeDaysResponse(**result)
+
+
 @router.get("/leave-balances", response_model=List[LeaveBalanceResponse])
 async def get_leave_balances(
+    response: Response,
     page: int = 1,
     page_size: int = 50,
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     org_id = current_user["org_id"]
     year = datetime.now(timezone.utc).year
 
-    skip = (max(1, page) - 1) * page_size
-
-    if current_user.get("role") == "admin":
-        balances = await db.leave_balances.find(
-            {"org_id": org_id, "year": year},
-            {"_id": 0}
-        ).skip(skip).to_list(page_size)
-    else:
-        balances = await db.leave_balances.find(
-            {"org_id": org_id, "user_id": current_user["user_id"], "year": year},
-            {"_id": 0}
-        ).skip(skip).to_list(page_size)
-
-    # Enrich with user and type info
-    user_ids = list(set(b["user_id"] for b in balances))
-    type_ids = list(set(b["leave_type_id"] for b in balances))
-
-    users = {u["user_id"]: u async for u in db.users.find(
-        {"user_id": {"$in": user_ids}}, {"_id": 0, "user_id": 1, "name": 1}
-    )}
-    types = {t["id"]: t async for t in db.leave_types.find(
-        {"id": {"$in": type_ids}}, {"_id": 0, "id": 1, "name": 1, "color": 1}
-    )}
-
-    for b in balances:
-        u = users.get(b["user_id"], {})
-        t = types.get(b["leave_type_id"], {})
-        b["user_name"] = u.get("name", "")
-        b["leave_type_name"] = t.get("name", "")
-        b["leave_type_color"] = t.get("color", "#666")
-        b["remaining_days"] = b["total_days"] - b["used_days"]
+    query = {"org_id": org_id, "year": year}
+    if current_user.get("role") != "admin":
+        query["user_id"] = current_user["user_id"]
 
-    return balances
+    return await aggregate_page(
+        db.leave_balances, query, BALANCE_RESPONSE_STAGES, BALANCES_KEYSET,
+        response, page, page_size, cursor
+    )
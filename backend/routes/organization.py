@@ -1,21 +1,26 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 
 from database import db
 from auth import get_current_user, get_admin_user
+from metadata import tenant_metadata
 from models import Organization, OrgSettings, SuccessResponse
+from response_cache import response_cache
+from versions import org_versions
 
 router = APIRouter(prefix="/api", tags=["organization"])
 
 
 @router.get("/organization", response_model=Organization)
-async def get_organization(current_user: dict = Depends(get_current_user)):
-    org = await db.organizations.find_one(
-        {"org_id": current_user["org_id"]},
-        {"_id": 0}
-    )
-    if not org:
-        raise HTTPException(status_code=404, detail="Organizzazione non trovata")
-    return org
+async def get_organization(request: Request, current_user: dict = Depends(get_current_user)):
+    org_id = current_user["org_id"]
+
+    async def load():
+        org = await tenant_metadata.organization(org_id)
+        if not org:
+            raise HTTPException(status_code=404, detail="Organizzazione non trovata")
+        return org
+
+    return await response_cache.respond(request, org_id, Organization, load)
 
 
 @router.put("/organization", response_model=SuccessResponse)
@@ -30,32 +35,36 @@ async def update_organization(data: dict, current_user: dict = Depends(get_admin
             {"org_id": current_user["org_id"]},
             {"$set": updates}
         )
+        tenant_metadata.invalidate(current_user["org_id"])
+        org_versions.bump(current_user["org_id"])
     return SuccessResponse()
 
 
 @router.get("/settings/rules", response_model=OrgSettings)
-async def get_rules(current_user: dict = Depends(get_current_user)):
+async def get_rules(request: Request, current_user: dict = Depends(get_current_user)):
     org_id = current_user["org_id"]
-    settings = await db.org_settings.find_one(
-        {"org_id": org_id},
-        {"_id": 0}
-    )
-    if not settings:
-        return OrgSettings(
-            org_id=org_id,
-            min_notice_days=7,
-            max_consecutive_days=15,
-            auto_approve_under_days=0,
-            blocked_periods=[]
-        )
-    return settings
+
+    async def load():
+        settings = await tenant_metadata.settings(org_id)
+        if not settings:
+            return OrgSettings(
+                org_id=org_id,
+                min_notice_days=7,
+                max_consecutive_days=15,
+                auto_approve_under_days=0,
+                blocked_periods=[]
+            )
+        return settings
+
+    return await response_cache.respond(request, org_id, OrgSettings, load)
 
 
 @router.put("/settings/rules", response_model=SuccessResponse)
 async def update_rules(data: dict, current_user: dict = Depends(get_admin_user)):
     org_id = current_user["org_id"]
     updates = {"org_id": org_id}
-    for key in ["min_notice_days", "max_consecutive_days", "auto_approve_under_days", "blocked_periods"]:
+    for key in ["min_notice_days", "max_consecutive_days", "auto_approve_under_days",
+                "blocked_periods", "carry_over_max_days"]:
         if key in data:
             updates[key] = data[key]
 
@@ -64,4 +73,6 @@ async def update_rules(data: dict, current_user: dict = Depends(get_admin_user))
         {"$set": updates},
         upsert=True
     )
+    tenant_metadata.invalidate(org_id)
+    org_versions.bump(org_id)
     return SuccessResponse()
@@ -1,57 +1,52 @@
+import asyncio
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 
 from database import db
 from auth import get_current_user
 from models import StatsResponse
+from org_stats import org_stats
+from response_cache import response_cache
 
 router = APIRouter(prefix="/api", tags=["stats"])
 
 
 @router.get("/stats", response_model=StatsResponse)
-async def get_stats(current_user: dict = Depends(get_current_user)):
+async def get_stats(request: Request, current_user: dict = Depends(get_current_user)):
     org_id = current_user["org_id"]
-    year = datetime.now(timezone.utc).year
-
-    approved_count = await db.leave_requests.count_documents({
-        "org_id": org_id,
-        "status": "approved",
-        "start_date": {"$regex": f"^{year}"}
-    })
-
-    pending_count = await db.leave_requests.count_documents({
-        "org_id": org_id,
-        "status": "pending"
-    })
-
-    total_staff = await db.users.count_documents({"org_id": org_id})
-
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    on_leave = await db.leave_requests.count_documents({
-        "org_id": org_id,
-        "status": "approved",
-        "start_date": {"$lte": today},
-        "end_date": {"$gte": today}
-    })
-
-    available_staff = total_staff - on_leave
+    return await response_cache.respond(request, org_id, StatsResponse, lambda: _compute_stats(org_id))
+
+
+async def _compute_stats(org_id: str) -> StatsResponse:
+    """Dashboard figures from the org's materialized counters (org_stats),
+    plus the two values that depend on the current moment."""
+    now = datetime.now(timezone.utc)
+    year, today = str(now.year), now.strftime("%Y-%m-%d")
+
+    counters, total_staff, on_leave = await asyncio.gather(
+        org_stats.get(org_id),
+        db.users.count_documents({"org_id": org_id}),
+        db.leave_requests.count_documents({
+            "org_id": org_id,
+            "status": "approved",
+            "start_date": {"$lte": today},
+            "end_date": {"$gte": today}
+        }),
+    )
+    years = counters.get("years", {})
+    this_year = years.get(year, {})
 
     # Calculate utilization rate
-    balances = await db.leave_balances.find(
-        {"org_id": org_id, "year": year},
-        {"_id": 0}
-    ).to_list(1000)
-
-    total_available = sum(b.get("total_days", 0) for b in balances)
-    total_used = sum(b.get("used_days", 0) for b in balances)
+    total_available = this_year.get("total_days", 0)
+    total_used = this_year.get("used_days", 0)
     utilization_rate = round((total_used / total_available * 100) if total_available > 0 else 0)
 
     return StatsResponse(
-        approved_count=approved_count,
-        pending_count=pending_count,
+        approved_count=this_year.get("approved", 0),
+        pending_count=sum(y.get("pending", 0) for y in years.values()),
         total_staff=total_staff,
-        available_staff=available_staff,
+        available_staff=total_staff - on_leave,
         on_leave_today=on_leave,
         utilization_rate=utilization_rate,
     )
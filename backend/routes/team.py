@@ -1,26 +1,45 @@
 import uuid
 import logging
 from datetime import datetime, timezone
-from typing import List
-
-from fastapi import APIRouter, HTTPException, Depends
-
-from database import db, init_leave_balances
-from auth import get_current_user, get_admin_user, get_password_hash, validate_password
-from models import TeamMember, SuccessResponse, InviteResponse
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+
+from balances import init_leave_balances, release_requests
+from cascade import cascade_delete
+from database import db
+from auth import (
+    get_current_user, get_admin_user, get_password_hash, validate_password,
+    invalidate_user
+)
+from jobs import job_runner
+from org_stats import org_stats
+from overlap import overlap_checker
+from pagination import Keyset, fetch_page
+from response_cache import response_cache
+from versions import org_versions
+from models import TeamMember, SuccessResponse, InviteResponse, JobStartedResponse
 
 logger = logging.getLogger("powerleave")
 router = APIRouter(prefix="/api/team", tags=["team"])
 
+TEAM_KEYSET = Keyset([("created_at", 1), ("user_id", 1)])
+
 
 @router.get("", response_model=List[TeamMember])
-async def get_team(current_user: dict = Depends(get_current_user)):
+async def get_team(
+    request: Request,
+    response: Response,
+    page: int = 1,
+    page_size: int = 200,
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
     org_id = current_user["org_id"]
-    members = await db.users.find(
-        {"org_id": org_id},
-        {"_id": 0, "password_hash": 0}
-    ).to_list(200)
-    return members
+    return await response_cache.respond(request, org_id, List[TeamMember], lambda: fetch_page(
+        db.users, {"org_id": org_id}, {"_id": 0, "password_hash": 0},
+        TEAM_KEYSET, response, page, page_size, cursor
+    ), response)
 
 
 @router.post("/invite", response_model=InviteResponse)
@@ -44,7 +63,7 @@ async def invite_member(data: dict, current_user: dict = Depends(get_admin_user)
         "user_id": user_id,
         "email": email,
         "name": name,
-        "password_hash": get_password_hash(temp_password),
+        "password_hash": await get_password_hash(temp_password),
         "role": role,
         "org_id": org_id,
         "picture": None,
@@ -52,6 +71,7 @@ async def invite_member(data: dict, current_user: dict = Depends(get_admin_user)
         "invited_by": current_user["user_id"]
     })
     await init_leave_balances(user_id, org_id, now.year)
+    org_versions.bump(org_id)
 
     logger.info("Invited user %s (%s) with temp password: %s", name, email, temp_password)
 
@@ -74,11 +94,15 @@ async def update_team_member(user_id: str, data: dict, current_user: dict = Depe
             {"user_id": user_id, "org_id": current_user["org_id"]},
             {"$set": updates}
         )
+        invalidate_user(user_id)
+        org_versions.bump(current_user["org_id"])
     return SuccessResponse()
 
 
-@router.delete("/{user_id}", response_model=SuccessResponse)
+@router.delete("/{user_id}", response_model=JobStartedResponse)
 async def remove_team_member(user_id: str, current_user: dict = Depends(get_admin_user)):
+    """Remove the member now; their balances and leave requests are
+    removed by a background job (progress at /api/jobs/{job_id})."""
     if user_id == current_user["user_id"]:
         raise HTTPException(status_code=400, detail="Non puoi rimuovere te stesso")
 
@@ -87,8 +111,19 @@ async def remove_team_member(user_id: str, current_user: dict = Depends(get_admi
     )
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Membro non trovato")
-
-    await db.leave_balances.delete_many({"user_id": user_id})
-    await db.leave_requests.delete_many({"user_id": user_id})
-
-    return SuccessResponse()
+    invalidate_user(user_id)
+    org_versions.bump(current_user["org_id"])
+
+    async def work(job):
+        org_id = current_user["org_id"]
+        # Balances go first: the requests' days then have nothing to restore
+        deleted = await cascade_delete(job, [
+            (db.leave_balances, {"user_id": user_id}, lambda docs: org_stats.balances_deleted(org_id, docs)),
+            (db.leave_requests, {"user_id": user_id}, lambda docs: release_requests(org_id, docs)),
+        ])
+        overlap_checker.invalidate(user_id)
+        org_versions.bump(current_user["org_id"])
+        return deleted
+
+    job_id = await job_runner.start("member_delete", current_user["org_id"], current_user["user_id"], work)
+    return JobStartedResponse(job_id=job_id)
@@ -1,7 +1,9 @@
 import uuid
 from datetime import datetime, timedelta, timezone
 
-from database import db, init_leave_balances
+from balances import init_leave_balances
+from database import db
+from org_stats import org_stats
 from auth import get_password_hash
 
 
@@ -15,24 +17,7 @@ async def seed_default_data():
             {"id": "maternita", "name": "Maternità/Paternità", "color": "#A855F7", "days_per_year": 150, "org_id": None},
         ]
         await db.leave_types.insert_many(default_types)
-
-    existing_closures = await db.company_closures.count_documents({})
-    if existing_closures == 0:
-        holidays = [
-            {"id": str(uuid.uuid4()), "org_id": None, "start_date": "2026-01-01", "end_date": "2026-01-01", "reason": "Capodanno", "type": "holiday"},
-            {"id": str(uuid.uuid4()), "org_id": None, "start_date": "2026-01-06", "end_date": "2026-01-06", "reason": "Epifania", "type": "holiday"},
-            {"id": str(uuid.uuid4()), "org_id": None, "start_date": "2026-04-05", "end_date": "2026-04-05", "reason": "Pasqua", "type": "holiday"},
-            {"id": str(uuid.uuid4()), "org_id": None, "start_date": "2026-04-06", "end_date": "2026-04-06", "reason": "Lunedì dell'Angelo", "type": "holiday"},
-            {"id": str(uuid.uuid4()), "org_id": None, "start_date": "2026-04-25", "end_date": "2026-04-25", "reason": "Festa della Liberazione", "type": "holiday"},
-            {"id": str(uuid.uuid4()), "org_id": None, "start_date": "2026-05-01", "end_date": "2026-05-01", "reason": "Festa dei Lavoratori", "type": "holiday"},
-            {"id": str(uuid.uuid4()), "org_id": None, "start_date": "2026-06-02", "end_date": "2026-06-02", "reason": "Festa della Repubblica", "type": "holiday"},
-            {"id": str(uuid.uuid4()), "org_id": None, "start_date": "2026-08-15", "end_date": "2026-08-15", "reason": "Ferragosto", "type": "holiday"},
-            {"id": str(uuid.uuid4()), "org_id": None, "start_date": "2026-11-01", "end_date": "2026-11-01", "reason": "Ognissanti", "type": "holiday"},
-            {"id": str(uuid.uuid4()), "org_id": None, "start_date": "2026-12-08", "end_date": "2026-12-08", "reason": "Immacolata Concezione", "type": "holiday"},
-            {"id": str(uuid.uuid4()), "org_id": None, "start_date": "2026-12-25", "end_date": "2026-12-25", "reason": "Natale", "type": "holiday"},
-            {"id": str(uuid.uuid4()), "org_id": None, "start_date": "2026-12-26", "end_date": "2026-12-26", "reason": "Santo Stefano", "type": "holiday"},
-        ]
-        await db.company_closures.insert_many(holidays)
+    # National holidays are not seeded: holidays.HolidayCalendar generates them for every year
 
 
 async def seed_demo_users():
@@ -42,6 +27,7 @@ async def seed_demo_users():
 
     org_id = "org_demo"
     now = datetime.now(timezone.utc)
+    demo_hash = await get_password_hash("demo123")
 
     await db.organizations.insert_one({
         "org_id": org_id, "name": "PowerLeave Demo",
@@ -50,23 +36,22 @@ async def seed_demo_users():
 
     users = [
         {"user_id": "user_admin", "email": "admin@demo.it", "name": "Marco Rossi",
-         "password_hash": get_password_hash("demo123"), "role": "admin",
+         "password_hash": demo_hash, "role": "admin",
          "org_id": org_id, "picture": None, "created_at": now},
         {"user_id": "user_mario", "email": "mario@demo.it", "name": "Mario Bianchi",
-         "password_hash": get_password_hash("demo123"), "role": "user",
+         "password_hash": demo_hash, "role": "user",
          "org_id": org_id, "picture": None, "created_at": now},
         {"user_id": "user_anna", "email": "anna@demo.it", "name": "Anna Verdi",
-         "password_hash": get_password_hash("demo123"), "role": "user",
+         "password_hash": demo_hash, "role": "user",
          "org_id": org_id, "picture": None, "created_at": now},
         {"user_id": "user_luigi", "email": "luigi@demo.it", "name": "Luigi Neri",
-         "password_hash": get_password_hash("demo123"), "role": "user",
+         "password_hash": demo_hash, "role": "user",
          "org_id": org_id, "picture": None, "created_at": now},
     ]
     await db.users.insert_many(users)
 
     year = now.year
-    for u in users:
-        await init_leave_balances(u["user_id"], org_id, year)
+    await init_leave_balances([u["user_id"] for u in users], org_id, year)
 
     # Sample leave requests
     sample_requests = [
@@ -99,3 +84,5 @@ async def seed_demo_users():
         {"user_id": "user_anna", "leave_type_id": "permesso", "year": year},
         {"$inc": {"used_days": 0.5}}
     )
+    # Sample data bypasses the write-path counter updates
+    await org_stats.rebuild(org_id)
@@ -3,18 +3,31 @@ PowerLeave - Modern Leave Management Platform for Italian SMBs
 Modular FastAPI application
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
+from auth import password_hasher, get_admin_user
+from auth_client import AuthServiceClient
+from cache import cache_stats
+from config import (
+    AUTH_SERVICE_URL, AUTH_SERVICE_TIMEOUT_SECONDS, AUTH_SERVICE_RETRIES,
+    AUTH_SESSION_CACHE_TTL_SECONDS, INDEX_AUDIT_ON_STARTUP
+)
 from database import create_indexes
+from index_audit import audit_indexes
+from jobs import job_runner
+from org_stats import run_verifier
+from pagination import NEXT_CURSOR_HEADER
 from seed import seed_default_data, seed_demo_users
 
-from routes.auth import router as auth_router, limiter
+from ratelimit import limiter
+from routes.auth import router as auth_router
 from routes.leave import router as leave_router
 from routes.stats import router as stats_router
 from routes.calendar import router as calendar_router
@@ -22,14 +35,31 @@ from routes.team import router as team_router
 from routes.organization import router as organization_router
 from routes.announcements import router as announcements_router
 from routes.closures import router as closures_router
+from routes.export import router as export_router
+from routes.jobs import router as jobs_router
+from routes.analytics import router as analytics_router
 
 
 @asynccontextmanager
 async def lifespan(app):
     await create_indexes()
+    if INDEX_AUDIT_ON_STARTUP in ("report", "create"):
+        await audit_indexes(create=INDEX_AUDIT_ON_STARTUP == "create")
     await seed_default_data()
     await seed_demo_users()
+    app.state.auth_client = AuthServiceClient(
+        AUTH_SERVICE_URL,
+        timeout=AUTH_SERVICE_TIMEOUT_SECONDS,
+        retries=AUTH_SERVICE_RETRIES,
+        cache_ttl=AUTH_SESSION_CACHE_TTL_SECONDS,
+    )
+    await app.state.auth_client.start()
+    verifier = asyncio.create_task(run_verifier())
     yield
+    verifier.cancel()
+    await job_runner.shutdown()
+    await app.state.auth_client.aclose()
+    password_hasher.shutdown()
 
 
 app = FastAPI(
@@ -52,7 +82,8 @@ app.add_middleware(
     ],
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["Content-Type", "Authorization"],
+    allow_headers=["Content-Type", "Authorization", "If-None-Match"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
 # Include all routers
@@ -64,6 +95,9 @@ app.include_router(team_router)
 app.include_router(organization_router)
 app.include_router(announcements_router)
 app.include_router(closures_router)
+app.include_router(export_router)
+app.include_router(jobs_router)
+app.include_router(analytics_router)
 
 
 @app.get("/api/health")
@@ -71,6 +105,12 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
 
 
+@app.get("/api/metrics/cache")
+async def get_cache_metrics(current_user: dict = Depends(get_admin_user)):
+    """Per-worker hit/miss counters of the in-process caches."""
+    return cache_stats()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
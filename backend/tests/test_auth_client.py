@@ -0,0 +1,111 @@
+"""
+AuthServiceClient tests against a local stub of the Emergent Auth service.
+No backend server or database is required.
+Run: pytest tests/test_auth_client.py -v
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth_client import AuthServiceClient  # noqa: E402
+
+
+class StubAuthHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    calls = []
+    failures_left = 0
+
+    def do_GET(self):
+        session_id = self.path.rsplit("/", 1)[-1]
+        StubAuthHandler.calls.append(session_id)
+
+        if StubAuthHandler.failures_left > 0:
+            StubAuthHandler.failures_left -= 1
+            self._reply(503, {"detail": "unavailable"})
+        elif session_id.startswith("valid"):
+            self._reply(200, {"user": {"email": f"{session_id}@stub.it", "name": "Stub"}})
+        else:
+            self._reply(401, {"detail": "invalid"})
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def stub_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubAuthHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def reset_stub():
+    StubAuthHandler.calls = []
+    StubAuthHandler.failures_left = 0
+
+
+def _run(coro_fn, base_url, **kwargs):
+    async def runner():
+        client = AuthServiceClient(base_url, timeout=2, **kwargs)
+        await client.start()
+        try:
+            return await coro_fn(client)
+        finally:
+            await client.aclose()
+    return asyncio.run(runner())
+
+
+class TestAuthServiceClient:
+    def test_valid_session(self, stub_url):
+        data = _run(lambda c: c.get_session("valid_1"), stub_url)
+        assert data["user"]["email"] == "valid_1@stub.it"
+
+    def test_invalid_session_returns_none(self, stub_url):
+        assert _run(lambda c: c.get_session("bogus"), stub_url) is None
+
+    def test_repeated_exchange_is_cached(self, stub_url):
+        async def twice(client):
+            first = await client.get_session("valid_2")
+            second = await client.get_session("valid_2")
+            return first, second
+        first, second = _run(twice, stub_url)
+        assert first == second
+        assert StubAuthHandler.calls == ["valid_2"]
+
+    def test_concurrent_double_submit_single_upstream_call(self, stub_url):
+        async def concurrent(client):
+            return await asyncio.gather(
+                client.get_session("valid_3"), client.get_session("valid_3")
+            )
+        results = _run(concurrent, stub_url)
+        assert results[0] == results[1]
+        assert StubAuthHandler.calls == ["valid_3"]
+
+    def test_retries_server_errors(self, stub_url):
+        StubAuthHandler.failures_left = 2
+        data = _run(lambda c: c.get_session("valid_4"), stub_url, retries=2)
+        assert data is not None
+        assert len(StubAuthHandler.calls) == 3
+
+    def test_unreachable_service_raises(self):
+        with pytest.raises(httpx.RequestError):
+            _run(lambda c: c.get_session("valid_5"), "http://127.0.0.1:1", retries=1)
@@ -0,0 +1,146 @@
+"""
+Holiday calendar tests: computus, national holidays, the YearCalendar
+bitsets and HolidayCalendar over a stub closures collection.
+No backend server or database is required.
+Run: pytest tests/test_holidays.py -v
+"""
+
+import asyncio
+import os
+import sys
+from datetime import date
+
+import pytest
+
+# config requires these at import; no connection is made here. Match
+# tests/test_rollover.py, which may share the imported config in one run.
+os.environ.setdefault("MONGO_URL", os.environ.get("TEST_MONGO_URL", "mongodb://localhost:1"))
+os.environ.setdefault("DB_NAME", "powerleave_test")
+os.environ.setdefault("SECRET_KEY", "holidays-test-secret")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import holidays  # noqa: E402
+from holidays import HolidayCalendar, YearCalendar, easter_sunday, national_holidays  # noqa: E402
+
+
+def _closure(closure_id, start, end=None, type_="shutdown", org_id="org_test"):
+    return {"id": closure_id, "org_id": org_id, "start_date": start,
+            "end_date": end or start, "reason": closure_id, "type": type_}
+
+
+class StubClosures:
+    """Just enough of company_closures for HolidayCalendar._load_closures."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        start, end = query["end_date"]["$gte"], query["start_date"]["$lte"]
+        docs = [d for d in self.docs if d["start_date"] <= end and d["end_date"] >= start]
+        return StubCursor(docs)
+
+
+class StubCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return [dict(d) for d in self.docs]
+
+
+@pytest.fixture
+def stub_closures(monkeypatch):
+    def install(docs):
+        monkeypatch.setattr(holidays, "db", type("StubDb", (), {"company_closures": StubClosures(docs)})())
+    return install
+
+
+class TestEaster:
+    @pytest.mark.parametrize("year, expected", [
+        (2000, date(2000, 4, 23)),
+        (2019, date(2019, 4, 21)),
+        (2024, date(2024, 3, 31)),
+        (2025, date(2025, 4, 20)),
+        (2026, date(2026, 4, 5)),
+        (2038, date(2038, 4, 25)),
+    ])
+    def test_known_dates(self, year, expected):
+        assert easter_sunday(year) == expected
+
+    def test_national_holidays(self):
+        days = dict(national_holidays(2026))
+        assert len(days) == 12
+        assert days[date(2026, 4, 6)] == "Lunedì dell'Angelo"
+        assert list(days) == sorted(days)
+
+
+class TestYearCalendar:
+    def test_closed_days_across_closures(self):
+        calendar = YearCalendar(2026, [
+            _closure("summer", "2026-08-10", "2026-08-21"),
+            _closure("ferragosto", "2026-08-15", type_="holiday"),
+        ])
+        assert calendar.closed_days("2026-08-01", "2026-08-31") == 12
+        assert calendar.closed_days("2026-08-01", "2026-08-10") == 1
+        assert calendar.closed_days("2026-08-21", "2026-08-31") == 1
+        assert calendar.closed_days("2026-08-22", "2026-08-31") == 0
+        assert calendar.is_closed("2026-08-15")
+        assert not calendar.is_closed("2026-08-09")
+        # Shutdowns close days but are not holidays
+        assert calendar.holiday_dates.tolist() == [date(2026, 8, 15)]
+
+    def test_closure_spanning_new_year_is_clipped(self):
+        closure = _closure("winter", "2026-12-28", "2027-01-02")
+        assert YearCalendar(2026, [closure]).closed_days("2026-12-01", "2026-12-31") == 4
+        assert YearCalendar(2027, [closure]).closed_days("2027-01-01", "2027-01-31") == 2
+
+    def test_leap_year(self):
+        calendar = YearCalendar(2028, [_closure("leap", "2028-02-29")])
+        assert len(calendar.closed) == 366
+        assert calendar.closed_days("2028-02-28", "2028-03-01") == 1
+
+
+class TestHolidayCalendar:
+    def test_holiday_dates_span_two_years(self, stub_closures):
+        stub_closures([])
+        dates = asyncio.run(HolidayCalendar(10, 60).holiday_dates("org_test", 2026, 2027))
+        assert len(dates) == 24
+        assert (dates[1:] > dates[:-1]).all()
+        assert str(dates[11]) == "2026-12-26"
+        assert str(dates[12]) == "2027-01-01"
+
+    def test_legacy_global_holidays_are_ignored(self, stub_closures):
+        stub_closures([
+            # Seeded by older versions: duplicates the generated Christmas
+            _closure("legacy-natale", "2026-12-25", type_="holiday", org_id=None),
+            # A global holiday on a non-national day is kept
+            _closure("patrono", "2026-06-29", type_="holiday", org_id=None),
+            _closure("org-shutdown", "2026-12-24", "2026-12-31"),
+        ])
+        calendar = asyncio.run(HolidayCalendar(10, 60).year("org_test", 2026))
+        ids = [c["id"] for c in calendar.closures]
+        assert "legacy-natale" not in ids
+        assert "patrono" in ids and "org-shutdown" in ids
+        assert ids.count("national-2026-12-25") == 1
+        assert len(calendar.holiday_dates) == 13
+
+    def test_invalid_closures_are_skipped(self, stub_closures):
+        stub_closures([
+            _closure("bad-end", "2026-08-03", "2026-13-45"),
+            _closure("reversed", "2026-09-10", "2026-09-01"),
+            _closure("unpadded", "2026-1-15", "2026-1-16"),
+        ])
+        calendar = asyncio.run(HolidayCalendar(10, 60).year("org_test", 2026))
+        ids = [c["id"] for c in calendar.closures]
+        assert "bad-end" not in ids and "reversed" not in ids
+        assert calendar.is_closed("2026-01-16")
+        assert calendar.closed_days("2026-08-01", "2026-09-30") == 1  # Ferragosto
+
+    def test_closures_over_range(self, stub_closures):
+        stub_closures([_closure("winter", "2026-12-28", "2027-01-02")])
+        closures = asyncio.run(HolidayCalendar(10, 60).closures("org_test", "2026-12-20", "2027-01-10"))
+        ids = [c["id"] for c in closures]
+        assert ids.count("winter") == 1
+        assert ids == ["national-2026-12-25", "national-2026-12-26", "winter",
+                       "national-2027-01-01", "national-2027-01-06"]
@@ -7,6 +7,7 @@ Run: pytest tests/test_powerleave_api.py -v
 import pytest
 import requests
 import os
+import time
 import uuid
 from datetime import datetime, timedelta
 
@@ -22,6 +23,31 @@ FUTURE_DATE_BASE = TODAY + timedelta(days=180)  # ~6 months ahead
 TEST_YEAR = FUTURE_DATE_BASE.year
 TEST_MONTH = FUTURE_DATE_BASE.month
 
+# Leave days are counted in working days: test requests must not fall on
+# weekends or national holidays
+FIXED_HOLIDAYS = {"01-01", "01-06", "04-25", "05-01", "06-02", "08-15", "11-01", "12-08", "12-25", "12-26"}
+
+
+def easter_monday(year: int) -> str:
+    """Anonymous Gregorian computus, plus one day."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    g = (b - (b + 8) // 25 + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    weekday = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * weekday) // 451
+    month, day = divmod(h + weekday - 7 * m + 114, 31)
+    return (datetime(year, month, day + 1) + timedelta(days=1)).strftime("%m-%d")
+
+
+def working_day(day: datetime) -> str:
+    while (day.weekday() >= 5 or day.strftime("%m-%d") in FIXED_HOLIDAYS
+           or day.strftime("%m-%d") == easter_monday(day.year)):
+        day += timedelta(days=1)
+    return day.strftime("%Y-%m-%d")
+
 
 # ──────────────────────────────────────────────
 # Fixtures
@@ -153,7 +179,7 @@ class TestLeaveRequests:
         """Create a leave request on a unique future date to avoid overlaps."""
         # Use a unique date based on RUN_ID within valid range (next 6-12 months)
         unique_day = (int(RUN_ID, 16) % 28) + 1  # 1-28
-        start = f"{TEST_YEAR}-{TEST_MONTH:02d}-{unique_day:02d}"
+        start = working_day(datetime(TEST_YEAR, TEST_MONTH, unique_day))
         end = start
 
         resp = requests.post(f"{BASE_URL}/api/leave-requests",
@@ -185,7 +211,7 @@ class TestLeaveRequests:
         next_month = TEST_MONTH + 1 if TEST_MONTH < 12 else 1
         next_year = TEST_YEAR if TEST_MONTH < 12 else TEST_YEAR + 1
         unique_day = ((int(RUN_ID, 16) + 5) % 28) + 1
-        start = f"{next_year}-{next_month:02d}-{unique_day:02d}"
+        start = working_day(datetime(next_year, next_month, unique_day))
         end = start
 
         # Create
@@ -348,6 +374,30 @@ class TestStatsAndData:
         for key in ["approved_count", "pending_count", "available_staff", "total_staff", "utilization_rate"]:
             assert key in d
 
+    def test_stats_follow_review(self, user_headers, admin_headers):
+        before = requests.get(f"{BASE_URL}/api/stats", headers=admin_headers).json()
+        start = working_day(FUTURE_DATE_BASE + timedelta(days=(int(RUN_ID, 16) % 40) + 250))
+        create_resp = requests.post(f"{BASE_URL}/api/leave-requests", headers=user_headers, json={
+            "leave_type_id": "permesso",
+            "start_date": start,
+            "end_date": start,
+            "hours": 8,
+            "notes": f"TEST_RUN_{RUN_ID}_stats"
+        })
+        assert create_resp.status_code == 200
+        created = requests.get(f"{BASE_URL}/api/stats", headers=admin_headers).json()
+        assert created["pending_count"] == before["pending_count"] + 1
+        assert created["approved_count"] == before["approved_count"]
+
+        review = requests.put(f"{BASE_URL}/api/leave-requests/{create_resp.json()['request_id']}/review",
+                              headers=admin_headers, json={"status": "approved"})
+        assert review.status_code == 200
+        approved = requests.get(f"{BASE_URL}/api/stats", headers=admin_headers).json()
+        # approved_count covers the current year only
+        this_year = start.startswith(str(datetime.now().year))
+        assert approved["pending_count"] == before["pending_count"]
+        assert approved["approved_count"] == before["approved_count"] + int(this_year)
+
     def test_calendar(self, admin_headers):
         resp = requests.get(f"{BASE_URL}/api/calendar/monthly?year=2026&month=3", headers=admin_headers)
         assert resp.status_code == 200
@@ -442,6 +492,17 @@ class TestClosuresSchema:
         assert "end_date" in first_closure, "end_date field must exist"
         # 'date' field should not exist (old schema)
 
+    def test_closures_without_year(self, admin_headers):
+        resp = requests.get(f"{BASE_URL}/api/closures", headers=admin_headers)
+        assert resp.status_code == 200
+        starts = [c["start_date"] for c in resp.json()]
+        assert starts == sorted(starts)
+
+    def test_create_closure_rejects_invalid_dates(self, admin_headers):
+        for body in ({"start_date": "2026-13-01"}, {"start_date": "2026-08-20", "end_date": "2026-08-10"}):
+            resp = requests.post(f"{BASE_URL}/api/closures", headers=admin_headers, json=body)
+            assert resp.status_code == 400
+
 
 class TestLeaveTypesCount:
     """Verify leave types contain expected Italian types"""
@@ -499,3 +560,373 @@ class TestDateValidation:
         })
         assert resp.status_code == 422
         assert "2 anni" in resp.json().get("detail", "")
+
+
+class TestTokenVerification:
+    """Verify cached token verification and cache metrics"""
+
+    def test_invalid_token_rejected_repeatedly(self):
+        """An invalid token stays rejected when served from the negative cache"""
+        headers = {"Authorization": f"Bearer invalid_{RUN_ID}"}
+        for _ in range(3):
+            resp = requests.get(f"{BASE_URL}/api/auth/me", headers=headers)
+            assert resp.status_code == 401
+
+    def test_cache_metrics_admin(self, admin_headers):
+        """Admins can read per-worker cache counters"""
+        resp = requests.get(f"{BASE_URL}/api/metrics/cache", headers=admin_headers)
+        assert resp.status_code == 200
+        data = resp.json()
+        assert "tokens" in data
+        assert "hit_rate" in data["tokens"]
+
+    def test_cache_metrics_user_forbidden(self, user_headers):
+        resp = requests.get(f"{BASE_URL}/api/metrics/cache", headers=user_headers)
+        assert resp.status_code == 403
+
+
+class TestLeaveImport:
+    """Verify bulk import of historical leave requests"""
+
+    def test_import_ndjson_reports_row_errors(self, admin_headers):
+        """Valid rows are imported, invalid rows are reported by number"""
+        body = "\n".join([
+            f'{{"email": "mario@demo.it", "leave_type_id": "ferie", "start_date": "2020-02-03", '
+            f'"end_date": "2020-02-04", "status": "rejected", "notes": "TEST_RUN_{RUN_ID}_import"}}',
+            f'{{"email": "nobody_{RUN_ID}@demo.it", "leave_type_id": "ferie", "start_date": "2020-02-03"}}',
+            '{"email": "mario@demo.it", "leave_type_id": "ferie", "start_date": "03/02/2020"}',
+        ])
+        resp = requests.post(
+            f"{BASE_URL}/api/leave-requests/import",
+            headers={**admin_headers, "Content-Type": "application/x-ndjson"},
+            data=body,
+        )
+        assert resp.status_code == 200, resp.text
+        data = resp.json()
+        assert data["total_rows"] == 3
+        assert data["imported"] == 1
+        assert [e["row"] for e in data["errors"]] == [2, 3]
+
+    def test_import_rejects_out_of_range_rows(self, admin_headers):
+        body = "\n".join([
+            '{"email": "mario@demo.it", "leave_type_id": "ferie", "start_date": "2020-02-03", "end_date": "9999-12-31"}',
+            '{"email": "mario@demo.it", "leave_type_id": "ferie", "start_date": "1900-02-05"}',
+            '{"email": "mario@demo.it", "leave_type_id": "ferie", "start_date": "2020-02-05", "hours": -4}',
+            '{"email": "mario@demo.it", "leave_type_id": "ferie", "start_date": "2020-02-05", "hours": 0}',
+        ])
+        resp = requests.post(
+            f"{BASE_URL}/api/leave-requests/import",
+            headers={**admin_headers, "Content-Type": "application/x-ndjson"},
+            data=body,
+        )
+        assert resp.status_code == 200, resp.text
+        data = resp.json()
+        assert data["imported"] == 0
+        assert [e["row"] for e in data["errors"]] == [1, 2, 3, 4]
+
+    def test_import_normalizes_unpadded_dates(self, admin_headers):
+        body = (
+            '{"email": "mario@demo.it", "leave_type_id": "ferie", "start_date": "2020-2-10", '
+            f'"end_date": "2020-2-11", "status": "rejected", "notes": "TEST_RUN_{RUN_ID}_unpadded_import"}}'
+        )
+        resp = requests.post(
+            f"{BASE_URL}/api/leave-requests/import",
+            headers={**admin_headers, "Content-Type": "application/x-ndjson"},
+            data=body,
+        )
+        assert resp.status_code == 200, resp.text
+        assert resp.json()["imported"] == 1
+
+    def test_import_csv(self, admin_headers):
+        body = (
+            "email,leave_type_id,start_date,end_date,status,notes\n"
+            f"mario@demo.it,permesso,2020-03-02,2020-03-02,rejected,TEST_RUN_{RUN_ID}_csv\n"
+        )
+        resp = requests.post(
+            f"{BASE_URL}/api/leave-requests/import?format=csv",
+            headers=admin_headers,
+            data=body,
+        )
+        assert resp.status_code == 200, resp.text
+        assert resp.json()["imported"] == 1
+
+    def test_user_cannot_import(self, user_headers):
+        resp = requests.post(
+            f"{BASE_URL}/api/leave-requests/import",
+            headers=user_headers,
+            data="{}",
+        )
+        assert resp.status_code == 403
+
+
+class TestBulkReview:
+    """Verify batch approve/reject of leave requests"""
+
+    def test_bulk_reject_with_unknown_id(self, user_headers, admin_headers):
+        day = working_day(FUTURE_DATE_BASE + timedelta(days=60 + int(RUN_ID, 16) % 28))
+        create_resp = requests.post(f"{BASE_URL}/api/leave-requests",
+            headers=user_headers,
+            json={
+                "leave_type_id": "permesso",
+                "start_date": day,
+                "end_date": day,
+                "hours": 4,
+                "notes": f"TEST_RUN_{RUN_ID}_bulk"
+            }
+        )
+        assert create_resp.status_code == 200, create_resp.text
+        req_id = create_resp.json()["request_id"]
+
+        resp = requests.post(f"{BASE_URL}/api/leave-requests/bulk-review",
+            headers=admin_headers,
+            json={"ids": [req_id, f"missing_{RUN_ID}"], "status": "rejected"}
+        )
+        assert resp.status_code == 200, resp.text
+        data = resp.json()
+        assert data["updated"] == 1
+        results = {r["id"]: r["result"] for r in data["results"]}
+        assert results[req_id] == "updated"
+        assert results[f"missing_{RUN_ID}"] == "not_found"
+
+        # Reviewing again reports it as already reviewed
+        again = requests.post(f"{BASE_URL}/api/leave-requests/bulk-review",
+            headers=admin_headers,
+            json={"ids": [req_id], "status": "approved"}
+        )
+        assert again.json()["results"][0]["result"] == "already_reviewed"
+
+    def test_bulk_review_invalid_status(self, admin_headers):
+        resp = requests.post(f"{BASE_URL}/api/leave-requests/bulk-review",
+            headers=admin_headers,
+            json={"ids": ["x"], "status": "maybe"}
+        )
+        assert resp.status_code == 400
+
+
+class TestCursorPagination:
+    """Verify keyset (cursor) pagination via the X-Next-Cursor header"""
+
+    def test_leave_requests_cursor_pages_do_not_repeat(self, admin_headers):
+        first = requests.get(f"{BASE_URL}/api/leave-requests?page_size=1", headers=admin_headers)
+        assert first.status_code == 200
+        cursor = first.headers.get("X-Next-Cursor")
+        if not cursor:
+            pytest.skip("Not enough leave requests for a second page")
+        second = requests.get(
+            f"{BASE_URL}/api/leave-requests?page_size=1&cursor={cursor}", headers=admin_headers
+        )
+        assert second.status_code == 200
+        if second.json():
+            assert second.json()[0]["id"] != first.json()[0]["id"]
+
+    def test_team_cursor(self, admin_headers):
+        first = requests.get(f"{BASE_URL}/api/team?page_size=2", headers=admin_headers)
+        assert first.status_code == 200
+        cursor = first.headers.get("X-Next-Cursor")
+        assert cursor, "Demo org has more than 2 members"
+        second = requests.get(f"{BASE_URL}/api/team?page_size=2&cursor={cursor}", headers=admin_headers)
+        assert second.status_code == 200
+        first_ids = {m["user_id"] for m in first.json()}
+        assert not first_ids & {m["user_id"] for m in second.json()}
+
+    def test_invalid_cursor_rejected(self, admin_headers):
+        resp = requests.get(f"{BASE_URL}/api/announcements?cursor=not-a-cursor", headers=admin_headers)
+        assert resp.status_code == 400
+
+
+class TestExport:
+    """Verify streaming NDJSON/CSV exports"""
+
+    def test_export_leave_requests_csv(self, admin_headers):
+        resp = requests.get(f"{BASE_URL}/api/export/leave-requests?format=csv", headers=admin_headers)
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/csv")
+        assert resp.text.splitlines()[0].startswith("id,user_id,user_name")
+
+    def test_export_leave_balances_ndjson(self, admin_headers):
+        import json
+        resp = requests.get(f"{BASE_URL}/api/export/leave-balances?format=ndjson", headers=admin_headers)
+        assert resp.status_code == 200
+        rows = [json.loads(line) for line in resp.text.splitlines() if line]
+        assert rows, "Demo org has balances"
+        assert "remaining_days" in rows[0]
+
+    def test_export_status_filter(self, admin_headers):
+        import json
+        resp = requests.get(
+            f"{BASE_URL}/api/export/leave-requests?status=approved", headers=admin_headers
+        )
+        assert resp.status_code == 200
+        for line in resp.text.splitlines():
+            assert json.loads(line)["status"] == "approved"
+
+    def test_export_requires_admin(self, user_headers):
+        resp = requests.get(f"{BASE_URL}/api/export/closure-exceptions", headers=user_headers)
+        assert resp.status_code == 403
+
+
+class TestWorkingDays:
+    """Verify leave days are counted as working days"""
+
+    def test_weekend_only_request_rejected(self, user_headers):
+        saturday = FUTURE_DATE_BASE + timedelta(days=(5 - FUTURE_DATE_BASE.weekday()) % 7)
+        sunday = saturday + timedelta(days=1)
+        resp = requests.post(f"{BASE_URL}/api/leave-requests", headers=user_headers, json={
+            "leave_type_id": "ferie",
+            "start_date": saturday.strftime("%Y-%m-%d"),
+            "end_date": sunday.strftime("%Y-%m-%d"),
+            "hours": 8,
+            "notes": f"TEST_RUN_{RUN_ID}_weekend"
+        })
+        assert resp.status_code == 422
+        assert "lavorativi" in resp.json().get("detail", "")
+
+    def test_recompute_days_admin(self, admin_headers):
+        resp = requests.post(f"{BASE_URL}/api/leave-requests/recompute-days", headers=admin_headers)
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["updated"] <= data["scanned"]
+        assert data["reconciled"] >= 0
+        assert data["skipped"] >= 0
+
+    def test_unpadded_dates_are_normalized(self, user_headers):
+        day = datetime.strptime(working_day(FUTURE_DATE_BASE + timedelta(days=(int(RUN_ID, 16) % 40) + 300)), "%Y-%m-%d")
+        unpadded = f"{day.year}-{day.month}-{day.day}"
+        resp = requests.post(f"{BASE_URL}/api/leave-requests", headers=user_headers, json={
+            "leave_type_id": "permesso",
+            "start_date": unpadded,
+            "end_date": unpadded,
+            "hours": 8,
+            "notes": f"TEST_RUN_{RUN_ID}_unpadded"
+        })
+        assert resp.status_code == 200, resp.text
+        mine = requests.get(f"{BASE_URL}/api/leave-requests", headers=user_headers).json()
+        created = [r for r in mine if r["id"] == resp.json()["request_id"]]
+        assert created[0]["start_date"] == day.strftime("%Y-%m-%d")
+
+
+class TestCarryOverRule:
+    """Verify the carry-over cap used by the annual rollover is configurable"""
+
+    def test_update_carry_over_max_days(self, admin_headers):
+        original = requests.get(f"{BASE_URL}/api/settings/rules", headers=admin_headers).json()
+        resp = requests.put(f"{BASE_URL}/api/settings/rules", headers=admin_headers,
+                            json={"carry_over_max_days": 5})
+        assert resp.status_code == 200
+        rules = requests.get(f"{BASE_URL}/api/settings/rules", headers=admin_headers).json()
+        assert rules["carry_over_max_days"] == 5
+        requests.put(f"{BASE_URL}/api/settings/rules", headers=admin_headers,
+                     json={"carry_over_max_days": original.get("carry_over_max_days")})
+
+
+class TestReviewStateMachine:
+    """Verify a request can only leave the pending state once"""
+
+    def test_second_review_conflicts(self, user_headers, admin_headers):
+        start = working_day(FUTURE_DATE_BASE + timedelta(days=(int(RUN_ID, 16) % 40) + 200))
+        create_resp = requests.post(f"{BASE_URL}/api/leave-requests", headers=user_headers, json={
+            "leave_type_id": "permesso",
+            "start_date": start,
+            "end_date": start,
+            "hours": 8,
+            "notes": f"TEST_RUN_{RUN_ID}_state_machine"
+        })
+        assert create_resp.status_code == 200
+        req_id = create_resp.json()["request_id"]
+
+        first = requests.put(f"{BASE_URL}/api/leave-requests/{req_id}/review",
+                             headers=admin_headers, json={"status": "rejected"})
+        assert first.status_code == 200
+        second = requests.put(f"{BASE_URL}/api/leave-requests/{req_id}/review",
+                              headers=admin_headers, json={"status": "approved"})
+        assert second.status_code == 409
+
+    def test_review_unknown_request(self, admin_headers):
+        resp = requests.put(f"{BASE_URL}/api/leave-requests/nonexistent-id/review",
+                            headers=admin_headers, json={"status": "approved"})
+        assert resp.status_code == 404
+
+
+class TestClosureAutoLeaveJob:
+    """Verify closure auto-leave runs as a background job"""
+
+    def test_auto_leave_returns_job(self, admin_headers):
+        day = working_day(FUTURE_DATE_BASE + timedelta(days=(int(RUN_ID, 16) % 40) + 300))
+        c = requests.post(f"{BASE_URL}/api/closures", headers=admin_headers, json={
+            "start_date": day, "end_date": day,
+            "reason": f"TEST_RUN_{RUN_ID}_job", "type": "shutdown",
+            "auto_leave": True, "allow_exceptions": True
+        })
+        assert c.status_code == 200
+        job_id = c.json()["job_id"]
+        assert job_id
+
+        job = None
+        for _ in range(50):
+            job = requests.get(f"{BASE_URL}/api/jobs/{job_id}", headers=admin_headers).json()
+            if job["status"] != "running":
+                break
+            time.sleep(0.2)
+        assert job["status"] == "completed"
+        assert job["result"]["created"] + job["result"]["skipped"] == job["total"]
+
+        # Deleting the closure cascades to its auto-leave in another job
+        d = requests.delete(f"{BASE_URL}/api/closures/{c.json()['id']}", headers=admin_headers)
+        assert d.status_code == 200
+        assert d.json()["job_id"]
+        again = requests.delete(f"{BASE_URL}/api/closures/{c.json()['id']}", headers=admin_headers)
+        assert again.status_code == 404
+
+    def test_unknown_job(self, admin_headers):
+        resp = requests.get(f"{BASE_URL}/api/jobs/nonexistent-id", headers=admin_headers)
+        assert resp.status_code == 404
+
+
+class TestAbsenceHeatmap:
+    """Verify the per-day absence heatmap"""
+
+    def test_heatmap_shape(self, admin_headers):
+        resp = requests.get(f"{BASE_URL}/api/analytics/heatmap?year=2026", headers=admin_headers)
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["days"] == 365
+        assert len(data["total"]) == 365
+        for series in data["series"]:
+            assert len(series["counts"]) == 365
+        # People absent for two leave types on a day count once in the total
+        for day, total in zip(zip(*[s["counts"] for s in data["series"]]), data["total"]):
+            assert max(day) <= total <= sum(day)
+
+    def test_heatmap_group_by_role(self, admin_headers):
+        resp = requests.get(f"{BASE_URL}/api/analytics/heatmap?year=2026&group_by=role", headers=admin_headers)
+        assert resp.status_code == 200
+        assert resp.json()["group_by"] == "role"
+
+    def test_heatmap_year_out_of_range(self, admin_headers):
+        resp = requests.get(f"{BASE_URL}/api/analytics/heatmap?year=10000", headers=admin_headers)
+        assert resp.status_code == 422
+
+    def test_heatmap_invalid_group(self, admin_headers):
+        resp = requests.get(f"{BASE_URL}/api/analytics/heatmap?group_by=password_hash", headers=admin_headers)
+        assert resp.status_code == 400
+
+
+class TestResponseCache:
+    """Verify ETag revalidation of cached org-scoped reads"""
+
+    def test_etag_not_modified(self, admin_headers):
+        resp = requests.get(f"{BASE_URL}/api/leave-types", headers=admin_headers)
+        assert resp.status_code == 200
+        etag = resp.headers["ETag"]
+        again = requests.get(f"{BASE_URL}/api/leave-types", headers={**admin_headers, "If-None-Match": etag})
+        assert again.status_code == 304
+
+    def test_write_changes_etag(self, admin_headers):
+        etag = requests.get(f"{BASE_URL}/api/settings/rules", headers=admin_headers).headers["ETag"]
+        rules = requests.get(f"{BASE_URL}/api/settings/rules", headers=admin_headers).json()
+        rules["min_notice_days"] = rules.get("min_notice_days", 0) + 1
+        assert requests.put(f"{BASE_URL}/api/settings/rules", json=rules, headers=admin_headers).status_code == 200
+        resp = requests.get(f"{BASE_URL}/api/settings/rules", headers={**admin_headers, "If-None-Match": etag})
+        assert resp.status_code == 200
+        rules["min_notice_days"] -= 1
+        requests.put(f"{BASE_URL}/api/settings/rules", json=rules, headers=admin_headers)
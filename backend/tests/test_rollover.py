@@ -0,0 +1,94 @@
+"""
+Annual rollover tests against a scratch MongoDB database (no backend server).
+Skipped unless TEST_MONGO_URL points to a MongoDB instance.
+Run: TEST_MONGO_URL=mongodb://localhost:27017 pytest tests/test_rollover.py -v
+"""
+
+import asyncio
+import os
+import sys
+import uuid
+
+import pytest
+
+# Not MONGO_URL: other offline test modules set it to a placeholder
+if not os.environ.get("TEST_MONGO_URL"):
+    pytest.skip("TEST_MONGO_URL not set", allow_module_level=True)
+os.environ["MONGO_URL"] = os.environ["TEST_MONGO_URL"]
+os.environ.setdefault("DB_NAME", "powerleave_test")
+os.environ.setdefault("SECRET_KEY", "rollover-test-secret")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db, create_indexes  # noqa: E402
+from rollover import rollover_all  # noqa: E402
+from seed import seed_default_data  # noqa: E402
+
+FROM_YEAR = 2025
+
+
+@pytest.fixture(scope="module")
+def loop():
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(create_indexes())
+    loop.run_until_complete(seed_default_data())
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def org(loop):
+    """An org with one user and a half-used ferie balance: 26 - 3.5 = 22.5 unused."""
+    org_id = f"org_rollover_{uuid.uuid4().hex[:8]}"
+    user_id = f"user_{uuid.uuid4().hex[:8]}"
+
+    async def setup():
+        await db.organizations.insert_one({"org_id": org_id, "name": "Rollover"})
+        await db.users.insert_one({"user_id": user_id, "org_id": org_id, "email": f"{user_id}@test.it"})
+        await db.org_settings.insert_one({"org_id": org_id, "carry_over_max_days": 30})
+        await db.leave_balances.insert_one({
+            "user_id": user_id, "org_id": org_id, "leave_type_id": "ferie",
+            "year": FROM_YEAR, "total_days": 26, "used_days": 3.5
+        })
+    loop.run_until_complete(setup())
+    yield org_id, user_id
+
+    async def teardown():
+        for collection in (db.organizations, db.users, db.org_settings, db.leave_balances,
+                           db.rollover_runs, db.org_stats):
+            await collection.delete_many({"org_id": org_id})
+    loop.run_until_complete(teardown())
+
+
+def _ferie(loop, user_id):
+    return loop.run_until_complete(db.leave_balances.find_one(
+        {"user_id": user_id, "leave_type_id": "ferie", "year": FROM_YEAR + 1}, {"_id": 0}
+    ))
+
+
+class TestRollover:
+    def test_carry_over_is_whole_days(self, loop, org):
+        org_id, user_id = org
+        loop.run_until_complete(rollover_all(FROM_YEAR, [org_id]))
+        balance = _ferie(loop, user_id)
+        assert balance["carried_over"] == 22
+        assert balance["total_days"] == 26 + 22
+        assert balance["used_days"] == 0
+
+    def test_rerun_is_idempotent_and_keeps_adjustments(self, loop, org):
+        org_id, user_id = org
+        loop.run_until_complete(rollover_all(FROM_YEAR, [org_id]))
+        loop.run_until_complete(db.leave_balances.update_one(
+            {"user_id": user_id, "leave_type_id": "ferie", "year": FROM_YEAR + 1},
+            {"$inc": {"total_days": 2, "used_days": 1}}
+        ))
+        loop.run_until_complete(rollover_all(FROM_YEAR, [org_id], force=True))
+        balance = _ferie(loop, user_id)
+        assert balance["total_days"] == 26 + 22 + 2
+        assert balance["used_days"] == 1
+
+    def test_finished_orgs_are_skipped(self, loop, org):
+        org_id, _ = org
+        assert len(loop.run_until_complete(rollover_all(FROM_YEAR, [org_id]))) == 1
+        assert loop.run_until_complete(rollover_all(FROM_YEAR, [org_id])) == []
+        assert len(loop.run_until_complete(rollover_all(FROM_YEAR, [org_id], force=True))) == 1
@@ -0,0 +1,111 @@
+import hashlib
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from jose import JWTError, jwt
+
+from cache import TTLCache
+from config import (
+    SECRET_KEY, ALGORITHM, TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL_SECONDS,
+    TOKEN_NEGATIVE_TTL_SECONDS
+)
+from database import db
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Motor returns naive datetimes (UTC) unless tz_aware is enabled
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class SessionStore:
+    """OAuth sessions in `user_sessions`, looked up by the unique
+    `session_id` index and purged by the TTL index on `expires_at`."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def create(self, user_id: str, lifetime: timedelta) -> str:
+        now = datetime.now(timezone.utc)
+        session_id = uuid.uuid4().hex
+        await self.collection.insert_one({
+            "session_id": session_id,
+            "user_id": user_id,
+            "created_at": now,
+            "expires_at": now + lifetime
+        })
+        return session_id
+
+    async def get(self, session_id: str):
+        return await self.collection.find_one(
+            {"session_id": session_id},
+            {"_id": 0, "user_id": 1, "expires_at": 1}
+        )
+
+
+class TokenVerifier:
+    """Resolves a bearer/cookie token to a user_id.
+
+    Tokens are keyed by their SHA-256 digest. Verified tokens are cached
+    until the shorter of the cache TTL and the token's own expiry; invalid
+    tokens are remembered for a short while so that replaying them costs
+    neither a JWT decode nor a session lookup."""
+
+    def __init__(self, sessions: SessionStore, maxsize: int, ttl: float, negative_ttl: float):
+        self.sessions = sessions
+        self.valid = TTLCache(maxsize=maxsize, ttl=ttl, name="tokens")
+        self.invalid = TTLCache(maxsize=maxsize, ttl=negative_ttl, name="tokens_invalid")
+
+    async def resolve(self, token: str) -> str:
+        key = hashlib.sha256(token.encode()).hexdigest()
+
+        user_id = self.valid.get(key)
+        if user_id is not None:
+            return user_id
+        detail = self.invalid.get(key)
+        if detail is not None:
+            raise HTTPException(status_code=401, detail=detail)
+
+        try:
+            user_id, expires_at = await self._verify(token)
+        except HTTPException as exc:
+            self.invalid.set(key, exc.detail)
+            raise
+
+        remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+        self.valid.set(key, user_id, ttl=min(self.valid.ttl, remaining))
+        return user_id
+
+    async def _verify(self, token: str):
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            payload = None
+
+        if payload is not None:
+            user_id = payload.get("sub")
+            if user_id is None:
+                raise HTTPException(status_code=401, detail="Token non valido")
+            return user_id, datetime.fromtimestamp(payload.get("exp", time.time()), timezone.utc)
+
+        # Not a JWT: try session lookup (for OAuth)
+        session = await self.sessions.get(token)
+        if not session or not session.get("user_id"):
+            raise HTTPException(status_code=401, detail="Token non valido")
+        expires_at = session.get("expires_at")
+        if expires_at is None:
+            expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.valid.ttl)
+        expires_at = _as_utc(expires_at)
+        if expires_at < datetime.now(timezone.utc):
+            raise HTTPException(status_code=401, detail="Sessione scaduta")
+        return session["user_id"], expires_at
+
+
+session_store = SessionStore(db.user_sessions)
+token_verifier = TokenVerifier(
+    session_store,
+    maxsize=TOKEN_CACHE_SIZE,
+    ttl=TOKEN_CACHE_TTL_SECONDS,
+    negative_ttl=TOKEN_NEGATIVE_TTL_SECONDS
+)
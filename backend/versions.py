@@ -0,0 +1,24 @@
+from collections import defaultdict
+from typing import Optional, Tuple
+
+
+class OrgVersions:
+    """Per-org change counter for this worker.
+
+    Write handlers call `bump(org_id)` after changing an org's data (org
+    None for data shared by every org, such as global leave types), and
+    caches of derived results put `get(org_id)` in their keys, so a write
+    orphans every cached result of the org at once. Other workers only see
+    their own bumps; their cache TTLs bound how stale they can get."""
+
+    def __init__(self):
+        self._versions = defaultdict(int)
+
+    def get(self, org_id: str) -> Tuple[int, int]:
+        return self._versions[None], self._versions[org_id]
+
+    def bump(self, org_id: Optional[str]):
+        self._versions[org_id] += 1
+
+
+org_versions = OrgVersions()